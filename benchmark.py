@@ -0,0 +1,169 @@
+#! /usr/bin/python3
+
+'''
+Stage level benchmark of the planner over the preset problems of driver.py.
+Every problem is run headless with a fixed seed. Each stage of a generation is timed separately:
+    init, selection/crossover, mutation, formatting, point validity, interpolation (with obstacle checking),
+    path_points, ik, collision, cost
+followed by the throughput of the full fitness function (evaluations/sec), the time per generation of
+a complete GA run, and its peak memory. Results are written as JSON, and can be compared with the
+results of another commit.
+
+usage: python3 benchmark.py [-o results.json] [--compare baseline.json] [--repeat N] [--generations G] [--ik-table]
+'''
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from driver import preset_params
+from genetic_algorithm import GeneticAlgorithm
+import trajectory_generation as tg
+from collision import ObstacleIndex, joint_positions
+
+
+def time_stage(fn, repeat):
+    """
+    :return: median wall time of fn in seconds, and the value fn returned
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        value = fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), value
+
+
+def make_ga(param, args):
+    mu = [0.5, 0.5] if len(param.link_lengths) == 2 else [0.4, 0.3, 0.3]
+    return GeneticAlgorithm(param.link_lengths, param.start_cood, param.end_cood, param.obs_coods, tg.fitness_population,
+                            mu, args.epsilon, args.population, 0.05, 0.30, args.generations, cache_size=0, verbose=False, seed=args.seed, ik_table=args.ik_table)
+
+
+def benchmark_stages(param, args):
+    ga = make_ga(param, args)
+    link_len, start, end, obstacles, epsilon, mu = ga.fitness_params
+    arm = tg.make_arm(link_len, args.ik_table)
+    stages = {}
+
+    stages['init'], chromosome = time_stage(ga.chromosome_init, args.repeat)
+    fitness_row = ga.fitness_mod(chromosome)
+    stages['selection_crossover'], chromosome = time_stage(lambda: ga.select_crossover(chromosome, fitness_row), args.repeat)
+    stages['mutation'], chromosome = time_stage(lambda: ga.mutate(chromosome), args.repeat)
+    population = ga.chromosome_to_points(chromosome)
+
+    # fitness stages, each timed on the survivors of the previous stage as in fitness_population
+    stages['formatting'], formatted = time_stage(lambda: tg.format(population), args.repeat)
+    stages['point_validity'], validity = time_stage(lambda: tg.check_point_validity(formatted, link_len, start, end), args.repeat)
+
+    def interpolation():
+        points, trajectories = tg.generate_trajectories(formatted, start, end, np.logical_not(validity))
+        return trajectories[tg.check_trajectory_validity(trajectories, obstacles)]
+    stages['interpolation'], trajectories = time_stage(interpolation, args.repeat)
+    stages['path_points'], (path, lengths) = time_stage(lambda: tg.path_points_population(trajectories, epsilon, start, end), args.repeat)
+    stages['ik'], (theta, solved) = time_stage(lambda: arm.inv_kin_batch(path), args.repeat)
+    solved = np.all(solved, axis=1)
+    theta, lengths = theta[solved], lengths[solved]
+    stages['collision'], free = time_stage(lambda: ObstacleIndex(obstacles, tg.OBSTACLE_RADIUS).poses_collide(joint_positions(theta, link_len)), args.repeat)
+    stages['cost'], cost = time_stage(lambda: tg.fitness_chrome_population(theta, lengths, mu), args.repeat)
+
+    fitness_time, _ = time_stage(lambda: tg.fitness_population(population, *ga.fitness_params, arm=arm), args.repeat)
+    return {
+        'stages': stages,
+        'survivors': {'points': int(np.count_nonzero(validity)), 'obstacles': len(trajectories), 'ik': int(np.count_nonzero(solved))},
+        'path_points_mean': float(np.mean(lengths)) if len(lengths) else 0.0,
+        'fitness_population': fitness_time,
+        'evaluations_per_sec': len(population) / fitness_time,
+    }
+
+
+def benchmark_run(param, args):
+    ga = make_ga(param, args)
+    tracemalloc.start()
+    start = time.perf_counter()
+    ga.run()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # timing without tracemalloc, which slows allocation heavy code
+    ga = make_ga(param, args)
+    start = time.perf_counter()
+    ga.run()
+    seconds = time.perf_counter() - start
+    return {
+        'generations': len(ga.fitness_stats),
+        'seconds': seconds,
+        'seconds_per_generation': seconds / max(len(ga.fitness_stats), 1),
+        'evaluations_per_sec': ga.evaluations / seconds,
+        'best_fitness': float(ga.best_so_far()[1]),
+        'peak_memory_bytes': peak,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print("{0:<36}{1:>14}{2:>14}{3:>9}".format("problem / stage", "baseline (s)", "current (s)", "ratio"))
+    for name, problem in results['problems'].items():
+        if name not in baseline['problems']:
+            continue
+        base = baseline['problems'][name]
+        rows = [(stage, base['stages'].get(stage), value) for stage, value in problem['stages'].items()]
+        rows.append(('fitness_population', base.get('fitness_population'), problem['fitness_population']))
+        rows.append(('seconds_per_generation', base['run']['seconds_per_generation'], problem['run']['seconds_per_generation']))
+        print(name)
+        for stage, old, new in rows:
+            if old is None:
+                continue
+            print("  {0:<34}{1:>14.6f}{2:>14.6f}{3:>9.2f}".format(stage, old, new, new / old if old else float('nan')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage level benchmark over the preset problems")
+    parser.add_argument('-o', '--output', help="write the results to this JSON file, stdout otherwise")
+    parser.add_argument('--compare', help="JSON results of a previous run to compare against")
+    parser.add_argument('--repeat', type=int, default=5, help="repetitions of every stage timing")
+    parser.add_argument('--generations', type=int, default=20, help="generations of the full GA run")
+    parser.add_argument('--population', type=int, default=40)
+    parser.add_argument('--epsilon', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ik-table', action='store_true', help="solve inverse kinematics with a precomputed IK table")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'problems': {},
+    }
+    for param in preset_params:
+        problem = benchmark_stages(param, args)
+        problem['run'] = benchmark_run(param, args)
+        results['problems'][param.description] = problem
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
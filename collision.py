@@ -0,0 +1,92 @@
+import numpy as np
+
+
+'''
+Collision checking of the arm links against point obstacles.
+joint_positions(theta, link_len) :
+    forward kinematics of any number of arm poses at once.
+ObstacleIndex(obs_coods, radius) :
+    obstacles sorted by x coordinate. Segments are first matched to the obstacles whose x lies in the
+    segment's x interval widened by the radius (found with searchsorted), and only those candidate
+    pairs get the exact segment to point distance test.
+'''
+
+
+def joint_positions(theta, link_len):
+    '''
+    :param theta: (... x L) array of link angles, each relative to the previous link
+    :param link_len: list of the L link lengths
+    :return: (... x L+1 x 2) array of the coordinates of the base, every joint and the end effector
+    '''
+    phi = np.cumsum(theta, axis=-1)
+    positions = np.zeros(theta.shape[:-1] + (theta.shape[-1] + 1, 2))
+    positions[..., 1:, 0] = np.cumsum(np.asarray(link_len) * np.cos(phi), axis=-1)
+    positions[..., 1:, 1] = np.cumsum(np.asarray(link_len) * np.sin(phi), axis=-1)
+    return positions
+
+
+class ObstacleIndex:
+
+    def __init__(self, obs_coods, radius, max_pairs=2**20):
+        '''
+        :param obs_coods: (N x 2) obstacle coordinates
+        :param radius: clearance every link must keep from every obstacle
+        :param max_pairs: largest number of candidate pairs tested at once, bounds the memory used
+        '''
+        obs_coods = np.reshape(np.asarray(obs_coods, dtype=float), [-1, 2])
+        order = np.argsort(obs_coods[:, 0])
+        self.x = obs_coods[order, 0]
+        self.y = obs_coods[order, 1]
+        self.radius = radius
+        self.max_pairs = max_pairs
+
+    def segments_collide(self, a, b):
+        '''
+        :param a: (S x 2) array of segment start points
+        :param b: (S x 2) array of segment end points
+        :return: (S) boolean array, True for segments closer than radius to any obstacle
+        '''
+        collide = np.zeros(len(a), dtype=bool)
+        if len(self.x) == 0 or len(a) == 0:
+            return collide
+
+        # broadphase, the obstacles within the x interval of every segment
+        lo = np.searchsorted(self.x, np.minimum(a[:, 0], b[:, 0]) - self.radius, side='left')
+        hi = np.searchsorted(self.x, np.maximum(a[:, 0], b[:, 0]) + self.radius, side='right')
+        counts = hi - lo
+        ends = np.cumsum(counts)
+
+        start = 0
+        while start < len(a):
+            stop = max(np.searchsorted(ends, ends[start] - counts[start] + self.max_pairs, side='right'), start + 1)
+            chunk = np.arange(start, min(stop, len(a)))
+            collide[chunk] = self.pairs_collide(a[chunk], b[chunk], lo[chunk], counts[chunk])
+            start = chunk[-1] + 1
+        return collide
+
+    def pairs_collide(self, a, b, lo, counts):
+        seg = np.repeat(np.arange(len(a)), counts)
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        obs = np.repeat(lo, counts) + np.arange(len(seg)) - first
+
+        # narrowphase, distance of the obstacle from the closest point of the segment
+        ab = b[seg] - a[seg]
+        ap = np.column_stack((self.x[obs], self.y[obs])) - a[seg]
+        length_sq = np.sum(ab ** 2, axis=1)
+        t = np.clip(np.divide(np.sum(ap * ab, axis=1), length_sq, out=np.zeros_like(length_sq), where=length_sq > 0), 0, 1)
+        distance_sq = np.sum((ap - t[:, None] * ab) ** 2, axis=1)
+
+        collide = np.zeros(len(a), dtype=bool)
+        collide[seg[distance_sq < self.radius ** 2]] = True
+        return collide
+
+    def poses_collide(self, positions):
+        '''
+        :param positions: (... x L+1 x 2) joint positions of arm poses, from joint_positions
+        :return: (...) boolean array, True for poses in which any link collides
+        '''
+        shape = positions.shape[:-2]
+        a = positions[..., :-1, :].reshape([-1, 2])
+        b = positions[..., 1:, :].reshape([-1, 2])
+        collide = self.segments_collide(a, b)
+        return np.any(collide.reshape(shape + (positions.shape[-2] - 1,)), axis=-1)
@@ -5,9 +5,7 @@
 import os
 
 import numpy as np
-import matplotlib.pyplot as plt
 
-from plotter import Plotter
 from genetic_algorithm import GeneticAlgorithm
 import trajectory_generation as tg
 from invkin import Arm
@@ -117,94 +115,108 @@ def select_link_lengths():
 
 
 
-while True:
+def main():
+	# plotting is only needed by the interactive driver, the planner itself does not load matplotlib
+	import matplotlib.pyplot as plt
+	from plotter import Plotter
+
+	rng = np.random.default_rng(1)
+
+	while True:
 
 	
-	plotter = Plotter()
+		plotter = Plotter()
+
+		link_lengths = None
+		start_cood = None
+		end_cood = None
+		obs_coods = None
+
+		ga_genr_2 = 300
+		ga_genr_3 = 20
+		ga_genr = 10
+		ga_pop_sz = 40
+		ga_mut_ratio = 0.05
+		ga_xov_ratio = 0.30
+		ga_mu_2 = [0.5,0.5]
+		ga_mu_3 = [0.4,0.3,0.3]
+		ga_mu = None
+		ga_eps = 0.1
+		ga_elite = 1
+		ga_stall = 50
+
+		param_method = select_param_method()
+
+		if param_method == 'q':
+			break
 
-	link_lengths = None
-	start_cood = None
-	end_cood = None
-	obs_coods = None
-
-	ga_genr_2 = 300
-	ga_genr_3 = 20
-	ga_genr = 10
-	ga_pop_sz = 40
-	ga_mut_ratio = 0.05
-	ga_xov_ratio = 0.30
-	ga_mu_2 = [0.5,0.5]
-	ga_mu_3 = [0.4,0.3,0.3]
-	ga_mu = None
-	ga_eps = 0.1
-
-	param_method = select_param_method()
-
-	if param_method == 'q':
-		break
-
-	elif param_method == 1:
-		param_idx = select_preset_param(preset_params)
+		elif param_method == 1:
+			param_idx = select_preset_param(preset_params)
 		
-		if param_idx == 'q':
-			break
+			if param_idx == 'q':
+				break
 
-		else:
-			link_lengths = preset_params[param_idx].link_lengths
-			start_cood = preset_params[param_idx].start_cood
-			end_cood = preset_params[param_idx].end_cood
-			obs_coods = preset_params[param_idx].obs_coods
+			else:
+				link_lengths = preset_params[param_idx].link_lengths
+				start_cood = preset_params[param_idx].start_cood
+				end_cood = preset_params[param_idx].end_cood
+				obs_coods = preset_params[param_idx].obs_coods
 
-			plotter.link_lengths = link_lengths
-			plotter.start_cood = start_cood
-			plotter.end_cood = end_cood
-			plotter.obs_coods = obs_coods
+				plotter.link_lengths = link_lengths
+				plotter.start_cood = start_cood
+				plotter.end_cood = end_cood
+				plotter.obs_coods = obs_coods
 
-			plotter.static_show()
+				plotter.static_show()
 
 
-	elif param_method == 2:
-		link_lengths = select_link_lengths()
+		elif param_method == 2:
+			link_lengths = select_link_lengths()
 
-		if link_lengths == 'q':
-			break
+			if link_lengths == 'q':
+				break
 
-		plotter.link_lengths = link_lengths
+			plotter.link_lengths = link_lengths
 		
-		plotter.picker_show()
+			plotter.picker_show()
 		
-		start_cood = plotter.start_cood
-		end_cood = plotter.end_cood
-		obs_coods = plotter.obs_coods
+			start_cood = plotter.start_cood
+			end_cood = plotter.end_cood
+			obs_coods = plotter.obs_coods
 
-		if len(obs_coods) < 2:
-			print("Select atleast two obstacles!")
-			continue
+			if len(obs_coods) < 2:
+				print("Select atleast two obstacles!")
+				continue
 
 
-	os.system('cls' if os.name == 'nt' else 'clear')
-	print("Robotic arm trajectory using Genetic Algorithm\n")
-	print("Running genetic algorithm... ")
+		os.system('cls' if os.name == 'nt' else 'clear')
+		print("Robotic arm trajectory using Genetic Algorithm\n")
+		print("Running genetic algorithm... ")
 
-	ga_mu = ga_mu_2 if len(link_lengths) == 2 else ga_mu_3
-	ga_genr = ga_genr_2 if len(link_lengths) == 2 else ga_genr_3
+		ga_mu = ga_mu_2 if len(link_lengths) == 2 else ga_mu_3
+		ga_genr = ga_genr_2 if len(link_lengths) == 2 else ga_genr_3
 
-	ga = GeneticAlgorithm(link_lengths, start_cood, end_cood, obs_coods, tg.fitness_population, ga_mu, ga_eps, ga_pop_sz, ga_mut_ratio, ga_xov_ratio, ga_genr)
-	output_chr = ga.run()
-	print("Done")
+		ga = GeneticAlgorithm(link_lengths, start_cood, end_cood, obs_coods, tg.fitness_population, ga_mu, ga_eps, ga_pop_sz, ga_mut_ratio, ga_xov_ratio, ga_genr,
+			elitism=ga_elite, stall_generations=ga_stall, seed=rng)
+		output_chr = ga.run()
+		print("Done ({0} generations, {1})".format(len(ga.fitness_stats), ga.stop_reason))
 
-	output_path = tg.chrome_traj(output_chr, start_cood, end_cood)
+		output_path = tg.chrome_traj(output_chr, start_cood, end_cood, ga_eps)
 
-	arm = Arm(link_lengths) if len(link_lengths) == 2 else Arm3Link(np.array(link_lengths))
-	link_angles_series = np.degrees(arm.time_series(output_path))
+		arm = Arm(link_lengths) if len(link_lengths) == 2 else Arm3Link(np.array(link_lengths))
+		link_angles_series = np.degrees(arm.time_series(output_path))
 
-	# plt.plot(ga.fitness_stats)
-	# plt.show()
+		# plt.plot(ga.fitness_stats)
+		# plt.show()
 	
-	plotter.transition_show(link_angles_series)
+		plotter.transition_show(link_angles_series)
+
+		usr_input = input("\nTry again? [y/n] ")
+		if usr_input == 'y':
+			continue
+		else:
+			break
+
 
-	usr_input = input("\nTry again? [y/n] ")
-	if usr_input == 'y':
-		continue
-	else:
-		break
+if __name__ == '__main__':
+	main()
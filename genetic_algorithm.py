@@ -1,11 +1,49 @@
+import time
+from collections import OrderedDict
+
 import numpy as np
-np.random.seed(1)
+
+from instrumentation import stage
+
+
+
+class FitnessCache:
+    """Bounded cache of fitness values keyed on the encoded chromosome bytes.
+    The least recently used entry is evicted once max_size entries are stored.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+    def __len__(self):
+        return len(self.entries)
 
 
 
 class GeneticAlgorithm:
     
-    def __init__(self, link_lengths, start_cood, end_cood, obs_coods, fitness, mu=[0.4,0.2], epsilon=0.1, population_size=120, mutation_percent=0.05, crossover_percent=0.30, generations=500):
+    def __init__(self, link_lengths, start_cood, end_cood, obs_coods, fitness, mu=[0.4,0.2], epsilon=0.1, population_size=120, mutation_percent=0.05, crossover_percent=0.30, generations=500, cache_size=4096, processes=None, verbose=True, elitism=1, stall_generations=None, min_improvement=0.0, target_fitness=None, instrument=None, seed=None, ik_table=False):
         self.L1 = link_lengths[0]
         self.L2 = link_lengths[1]
         
@@ -23,10 +61,12 @@ class GeneticAlgorithm:
         self.x_max = pow(2,self.L)-1          
         self.y_min = 0                   
         self.y_max = pow(2,self.L)-1          
+        self.gene_dtype = np.uint16      # genes are L bit unsigned integers
         
         self.R1 = sum(link_lengths)
         self.R2 = self.L1
         if self.R2 < 0: self.R2 = 0
+        self.gene_scale = (2*self.R1)/(2**self.L-1)     # gene value to coordinate
 
         self.population_size = population_size
         self.mutation_percent = mutation_percent
@@ -35,6 +75,29 @@ class GeneticAlgorithm:
         self.k = self.n_obstacles_interior() + 1
 
         self.fitness_stats = []
+        self.fitness_cache = FitnessCache(cache_size)
+        self.processes = processes      # worker processes for fitness evaluation, None to evaluate serially
+        self.parallel_fitness = None
+        self.ik_table = ik_table        # fitness solves inverse kinematics with a precomputed table (see ik_table.py)
+        self.arm = None                 # arm passed to the fitness function, only set when ik_table is used
+        self.verbose = verbose          # prints a * for every generation
+        self.fitness_rejections = {}    # chromosomes evaluated and rejected at every stage of the fitness function
+
+        self.elitism = elitism                      # best chromosomes copied unchanged into the next generation
+        self.stall_generations = stall_generations  # stop once the best fitness has not improved for this many generations
+        self.min_improvement = min_improvement      # relative improvement below which the best fitness counts as not improved
+        self.target_fitness = target_fitness        # stop once the best fitness reaches this value
+        self.stop_reason = None
+
+        self.evaluations = 0            # chromosomes evaluated by the fitness function, cache hits excluded
+        self.best = (None, 0)           # (points, fitness) of the best chromosome found so far
+        self.budget_used = {}
+        self.stop_requested = False
+        self.time_limit = None
+        self.max_evaluations = None
+        self.start_time = None
+        self.instrument = instrument    # Instrumentation collecting stage timers and counters, None to disable
+        self.rng = np.random.default_rng(seed)  # random numbers of every operator, seed may be an int, a SeedSequence or a Generator
 
 
     def n_obstacles_interior(self):
@@ -51,111 +114,281 @@ class GeneticAlgorithm:
 
 
     def chromosome_to_points(self, chromosome):
-        return (chromosome)*(2*self.R1)/(2**self.L-1) - self.R1
+        # decodes the whole population (or a single chromosome) at once
+        return chromosome*self.gene_scale - self.R1
 
 
     def chromosome_init(self):
-        chromosome = np.zeros((self.population_size,2*self.k))
-        # print(chromosome)
+        """Random initial population with every point inside the workspace annulus.
+        Each gene pair is accepted independently of the others, so candidate points are
+        oversampled in one batch, the invalid ones dropped and the rest packed into the
+        population. The cost does not depend on the number of interior points k.
+        """
+        n_points = self.population_size*self.k
+        chromosome = np.zeros((n_points,2), dtype=self.gene_dtype)
 
         centre_cood = [2**(self.L-1)-1, 2**(self.L-1)-1]
         distance_max = (self.x_max+1)/2
         distance_min = self.R2/self.R1*distance_max
+
+        #fraction of the sampled half plane rectangle lying inside the annulus
+        acceptance = (np.pi/2)*(distance_max**2-distance_min**2)/(2**self.L*2**(self.L-1))
         
-        for i,chrom in enumerate(chromosome):
-            chrom_valid = False
-            
-            while chrom_valid == False:
-                # random_chrom = np.random.randint(2**self.L,size=[self.k,2])
-                random_chrom_x = np.random.randint(2**self.L,size=[self.k])
-                random_chrom_y = np.random.randint(2**(self.L-1),size=[self.k]) + 2**(self.L-1)
-                random_chrom = np.column_stack((random_chrom_x,random_chrom_y))
+        filled = 0
+        while filled < n_points:
+            n_samples = int(1.2*(n_points-filled)/acceptance) + 16
+            random_chrom_x = self.rng.integers(2**self.L,size=n_samples)
+            random_chrom_y = self.rng.integers(2**(self.L-1),size=n_samples) + 2**(self.L-1)
 
-                distance = np.sqrt((random_chrom[:,0]-centre_cood[0])**2+(random_chrom[:,1]-centre_cood[1])**2)
+            distance = np.sqrt((random_chrom_x-centre_cood[0])**2+(random_chrom_y-centre_cood[1])**2)
+            valid = (distance_min < distance) & (distance_max > distance)
 
-                if np.all(distance_min < distance) and np.all(distance_max > distance):
-                    chrom_valid = True
-                    chromosome[i] = np.ravel(random_chrom)
+            random_chrom = np.column_stack((random_chrom_x[valid],random_chrom_y[valid]))[:n_points-filled]
+            chromosome[filled:filled+len(random_chrom)] = random_chrom
+            filled += len(random_chrom)
 
-        return chromosome
+        return chromosome.reshape((self.population_size,2*self.k))
 
 
     def fitness_mod(self,chromosome):
-        fitness_row, _ = self.fitness(self.chromosome_to_points(chromosome), *self.fitness_params)
-        for i,v in enumerate(fitness_row):
-            if np.isnan(v):
-                fitness_row[i] = 0
+        """Fitness of every chromosome, only chromosomes missing from the cache are evaluated.
+        Duplicates within the population are evaluated once.
+        """
+        fitness_row = np.zeros(len(chromosome))
+        pending = OrderedDict()     #chromosome bytes -> rows holding that chromosome
+        for i,chrom in enumerate(chromosome):
+            key = chrom.tobytes()
+            if key in pending:
+                pending[key].append(i)
+                self.fitness_cache.hits += 1
+                continue
+            value = self.fitness_cache.get(key)
+            if value is None:
+                pending[key] = [i]
             else:
-                fitness_row[i] = abs(v)
+                fitness_row[i] = value
+
+        if pending:
+            rows = [idx[0] for idx in pending.values()]
+            new_fitness = self.evaluate_points(self.chromosome_to_points(chromosome[rows]))
+            self.evaluations += len(rows)
+            if self.instrument is not None:
+                self.instrument.count('cache_hits', len(chromosome)-len(rows))
+                self.instrument.count('nan_fitness', np.count_nonzero(np.isnan(new_fitness)))
+            for (key,idx),v in zip(pending.items(), new_fitness):
+                v = 0 if np.isnan(v) else abs(v)
+                self.fitness_cache.put(key, v)
+                fitness_row[idx] = v
+        elif self.instrument is not None:
+            self.instrument.count('cache_hits', len(chromosome))
+        return fitness_row
+
+
+    def evaluate_points(self, points):
+        if self.instrument is None:
+            return self.evaluate_stats(points, self.fitness_rejections)
+
+        stats = {}
+        fitness_row = self.evaluate_stats(points, stats, instrument=self.instrument)
+        for key, value in stats.items():
+            self.fitness_rejections[key] = self.fitness_rejections.get(key, 0) + value
+            if key in self.instrument_counters:
+                self.instrument.count(self.instrument_counters[key], value)
+        return fitness_row
+
+
+    # fitness function stats key -> instrumentation counter
+    instrument_counters = {'evaluated': 'evaluations', 'points': 'invalid_points', 'obstacles': 'obstacle_rejections',
+                           'ik': 'ik_failures', 'collision': 'collisions'}
+
+
+    def evaluate_stats(self, points, stats, **kwargs):
+        if self.parallel_fitness is not None:
+            return self.parallel_fitness(points, stats=stats)
+        if self.arm is not None:
+            kwargs['arm'] = self.arm
+        fitness_row, _ = self.fitness(points, *self.fitness_params, stats=stats, **kwargs)
         return fitness_row
 
 
-    def run(self):
-        chromosome = self.chromosome_init()    #getting initial random chromosome
+    def select_crossover(self, chromosome, fitness_row):
+        """Roulette wheel selection and single point crossover for a whole generation.
+        All parent pairs are drawn with one searchsorted over the fitness cdf and the
+        children are built with masked array operations.
+        """
+        n_pairs = int(self.population_size/2)
+
+        total_fitness = np.sum(fitness_row)
+        if total_fitness > 0:
+            roulette_wheel_cdf = np.cumsum(fitness_row/total_fitness)    #cdf 
+        else:
+            roulette_wheel_cdf = np.arange(1,len(fitness_row)+1)/len(fitness_row)    #no valid chromosome yet, uniform selection
+        crossover_point = self.rng.integers(self.k-1) if self.k != 1 else 0                      #random crossover point 
+
+        index = np.searchsorted(roulette_wheel_cdf, self.rng.random((n_pairs,2)))
+        index = np.minimum(index, len(chromosome)-1)     #cdf may end slightly below 1
+        parent_0 = chromosome[index[:,0]]
+        parent_1 = chromosome[index[:,1]]
+
+        #genes after the crossover point are swapped, only for pairs selected for crossover
+        crossover = self.rng.random(n_pairs) < self.crossover_percent
+        tail = np.arange(2*self.k) >= 2*crossover_point+1
+        swap = crossover[:,None] & tail[None,:]
+
+        new_chromosome = np.zeros((self.population_size,2*self.k), dtype=chromosome.dtype)
+        new_chromosome[0:2*n_pairs:2] = np.where(swap, parent_1, parent_0)
+        new_chromosome[1:2*n_pairs:2] = np.where(swap, parent_0, parent_1)
+        return new_chromosome
+
+
+    def mutate(self, chromosome):
+        """Flips one random bit in each chromosome selected for mutation.
+        Works on the whole population with a single XOR against a mask of random bits.
+        """
+        mutated = self.rng.random(self.population_size) < self.mutation_percent
+        bit = self.rng.integers(self.L*2*self.k, size=self.population_size)
+        q = bit//self.L                  #gene to mutate
+        p = bit - self.L*q               #bit position in gene, 0 being the most significant
+
+        mask = np.zeros_like(chromosome)
+        mask[mutated,q[mutated]] = 1 << (self.L-1-p[mutated])
+        return chromosome ^ mask
+
+
+    def next_generation(self, chromosome, fitness_row):
+        """Selection, crossover and mutation of one generation.
+        Returns the new population and its fitness.
+        """
+        with stage(self.instrument, 'selection_crossover'):
+            new_chromosome = self.select_crossover(chromosome, fitness_row)     #selection and crossover
+        with stage(self.instrument, 'mutation'):
+            new_chromosome = self.mutate(new_chromosome)                        #mutation
+
+        if self.elitism > 0:                                                #elitism
+            elite = np.argsort(fitness_row)[::-1][:self.elitism]
+            new_chromosome[:len(elite)] = chromosome[elite]
+
+        with stage(self.instrument, 'fitness'):
+            fitness_row = self.fitness_mod(new_chromosome)
+        self.fitness_stats.append(max(fitness_row))
+        return new_chromosome, fitness_row
+
+
+    def spawn(self, n):
+        """n independent child random number generators, for workers or islands started from this run.
+        Children are derived from this GA's stream, so the same seed always gives the same children.
+        """
+        return self.rng.spawn(n)
+
+
+    def best_so_far(self):
+        """Points and fitness of the best chromosome found so far.
+        Can be called at any time, also from another thread while run() is in progress.
+        """
+        return self.best
+
+
+    def stop(self):
+        """Asks a run in progress to stop after the current generation"""
+        self.stop_requested = True
+
+
+    def update_best(self, chromosome, fitness_row):
+        max_idx = np.argmax(fitness_row)
+        if self.best[0] is None or fitness_row[max_idx] > self.best[1]:
+            self.best = (self.chromosome_to_points(chromosome[max_idx]), fitness_row[max_idx])
+
+
+    def stopping_criterion(self):
+        """Reason to stop before running all generations, one of 'stopped', 'time_limit', 'max_evaluations',
+        'target' or 'stalled'. None to continue
+        """
+        if self.stop_requested:
+            return 'stopped'
+        if self.time_limit is not None and time.perf_counter()-self.start_time >= self.time_limit:
+            return 'time_limit'
+        if self.max_evaluations is not None and self.evaluations >= self.max_evaluations:
+            return 'max_evaluations'
+        if not self.fitness_stats:
+            return None
+        if self.target_fitness is not None and self.fitness_stats[-1] >= self.target_fitness:
+            return 'target'
+        n = self.stall_generations
+        if n is not None and len(self.fitness_stats) > n:
+            if max(self.fitness_stats[-n:]) <= max(self.fitness_stats[:-n])*(1+self.min_improvement):
+                return 'stalled'
+        return None
+
+
+    def run(self, on_generation=None, time_limit=None, max_evaluations=None):
+        """Runs the genetic algorithm and returns the points of the best chromosome found.
+        on_generation(genr, chromosome, fitness_row), if given, is called after every generation
+        and returns the (possibly modified) population and fitness to continue with.
+        time_limit (seconds) and max_evaluations bound the run, both are checked between generations.
+        The part of the budget used is stored in budget_used.
+        """
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+        self.stop_requested = False
+        self.start_time = time.perf_counter()
+        evaluations_start = self.evaluations
+
+        if self.ik_table:
+            # built (or loaded) here first, so that the worker processes only memory map the saved table
+            import trajectory_generation as tg
+            self.arm = tg.make_arm(self.fitness_params[0], ik_table=True)
+        if self.processes is not None and self.processes > 1:
+            from parallel_fitness import ParallelFitness
+            self.parallel_fitness = ParallelFitness(self.fitness, self.fitness_params, 2*self.k, self.population_size, self.processes,
+                                                    ik_table=self.ik_table)
+        try:
+            return self.evolve(on_generation)
+        finally:
+            if self.parallel_fitness is not None:
+                self.parallel_fitness.close()
+                self.parallel_fitness = None
+            self.budget_used = {'seconds': time.perf_counter()-self.start_time, 'time_limit': time_limit,
+                                'evaluations': self.evaluations-evaluations_start, 'max_evaluations': max_evaluations,
+                                'generations': len(self.fitness_stats)}
+
+
+    def evolve(self, on_generation=None):
+        if self.instrument is not None:
+            self.instrument.start_generation()
+        with stage(self.instrument, 'init'):
+            chromosome = self.chromosome_init()    #getting initial random chromosome
         # print(chromosome)
 
         # fitness_row = self.fitness(self.chromosome_to_points(chromosome), *self.fitness_params)    #return a matrix which has fitness of respective input chromosomes
-        fitness_row = self.fitness_mod(chromosome)
-        # fitness_row = np.random.rand(self.population_size)  #remove it later on
+        with stage(self.instrument, 'fitness'):
+            fitness_row = self.fitness_mod(chromosome)
+        self.update_best(chromosome, fitness_row)
+        if self.instrument is not None:
+            self.instrument.end_generation(-1, best_fitness=float(self.best[1]))
         # print(fitness_row)
 
-        # s = 0
-        # while(s<self.generations):
         for genr in range(self.generations):
+            self.stop_reason = self.stopping_criterion()
+            if self.stop_reason is not None:
+                break
             
-            print("*", end="", flush=True)
+            if self.verbose:
+                print("*", end="", flush=True)
+            if self.instrument is not None:
+                self.instrument.start_generation()
             
-            roulette_wheel_cdf = np.cumsum(fitness_row/np.sum(fitness_row))    #cdf 
-            crossover_point = np.random.randint(self.k-1) if self.k != 1 else 0                      #random crossover point 
-            index = np.zeros((2))
-            new_chromosome = np.zeros((self.population_size,2*self.k))
-
-            for i in range(int(self.population_size/2)):                  #crossover
-
-                a = np.random.rand(2)
-                index = np.searchsorted(roulette_wheel_cdf, a)  
-                parent = np.array([chromosome[index[0]], chromosome[index[1]]])
-
-                if np.random.rand() < self.crossover_percent:
-                    new_chromosome[2*i+0,0:2*crossover_point+1] = parent[0,0:2*crossover_point+1]
-                    new_chromosome[2*i+0,2*crossover_point+1:2*self.k] = parent[1,2*crossover_point+1:2*self.k]
-                    new_chromosome[2*i+1,0:2*crossover_point+1] = parent[1,0:2*crossover_point+1]
-                    new_chromosome[2*i+1,2*crossover_point+1:2*self.k] = parent[0,2*crossover_point+1:2*self.k]
-                else:
-                    new_chromosome[2*i+0] = parent[0]
-                    new_chromosome[2*i+1] = parent[1]
-
-            # print(new_chromosome)
-
-            for i in range(self.population_size):                                 #mutation
-                if (np.random.rand() < self.mutation_percent):
-                    p = np.random.randint(12*2*self.k)
-                    q = int(np.floor(p/12))
-                    p = int(p - 12*q)
-
-                    binary = list(np.binary_repr(int(new_chromosome[i,q]),12))
-                    #flipping the pth binary place
-                    if (binary[p] == '0'):
-                        binary[p] = '1'
-                    elif (binary[p] == '1'):
-                        binary[p] = '0'
-                    binary_string = "".join(binary)            
-                    new_chromosome[i,q] = int(binary_string,2)
-
-            chromosome = new_chromosome
-            # s = s+1               #incrementing generation
-
-            # fitness_row = self.fitness(self.chromosome_to_points(chromosome), *self.fitness_params)    #return a matrix which has fitness of respective input chromosomes
-            fitness_row = self.fitness_mod(chromosome)
-            # fitness_row = np.random.rand(self.population_size)  #remove it later on
-            self.fitness_stats.append(max(fitness_row))
+            chromosome, fitness_row = self.next_generation(chromosome, fitness_row)
             # print(fitness_row)
+
+            if on_generation is not None:
+                chromosome, fitness_row = on_generation(genr, chromosome, fitness_row)
+            self.update_best(chromosome, fitness_row)
+            if self.instrument is not None:
+                self.instrument.end_generation(genr, best_fitness=float(self.best[1]))
+        else:
+            self.stop_reason = self.stopping_criterion() or 'generations'
         
-        print()
+        if self.verbose:
+            print()
 
-        # print(chromosome)
-        # fitness_row = self.fitness(chromosome, *self.fitness_params)
-        fitness_row = self.fitness_mod(chromosome)
-        max_idx = np.argmax(fitness_row)
-        return (self.chromosome_to_points(chromosome))[max_idx]
-    
+        return self.best[0]
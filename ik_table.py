@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+
+'''
+IKTable(arm, link_len, cells, tolerance, cache_dir) :
+    Inverse kinematics by table lookup. The arm's inv_kin_batch is solved once on a (cells+1 x cells+1) grid
+    of nodes over the square [-R, R] x [-R, R], R being the reach of the arm, and every query is answered by
+    bilinear interpolation of the joint angles at the 4 nodes of its cell.
+    The interpolation error of every cell is measured at its centre (where it is largest for a smooth
+    solution) against the exact solution. Points in cells whose error exceeds tolerance, or with a corner
+    node out of reach, are solved exactly by the arm, so the table never changes which points are reachable.
+    Tables are saved in cache_dir, one pair of .npy files per arm (link lengths, solver settings and grid),
+    and loaded memory mapped, so repeated runs and all worker processes share one copy.
+    IKTable has the inv_kin_batch interface of the arms and can replace them in fitness_population.
+'''
+
+
+def default_cache_dir():
+    return os.environ.get('IK_TABLE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'ik_tables'))
+
+
+def wrap(angles):
+    # into [-pi, pi)
+    return (angles + np.pi) % (2*np.pi) - np.pi
+
+
+def save_atomic(path, array):
+    # written to a temporary file in the same directory and renamed, readers never see a partial table
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class IKTable:
+
+    def __init__(self, arm, link_len, cells=256, tolerance=1e-3, cache_dir=None):
+        '''
+        :param arm: Arm or Arm3Link, solves the nodes and the points the table cannot answer
+        :param link_len: list of link lengths of the arm
+        :param cells: number of grid cells along each axis
+        :param tolerance: largest interpolation error (radians, any joint) of a cell answered from the table
+        :param cache_dir: directory of the saved tables, None for default_cache_dir(), False to not cache
+        '''
+        self.arm = arm
+        self.cells = cells
+        self.tolerance = tolerance
+        self.reach = float(sum(link_len))
+        self.step = 2*self.reach/cells
+
+        if cache_dir is False:
+            self.angles, self.error = self.build()
+        else:
+            self.angles, self.error = self.load(cache_dir or default_cache_dir(), link_len)
+        self.accurate = self.error <= tolerance     # cells answered from the table
+
+
+    def key(self, link_len):
+        # everything the solution depends on, solver settings included
+        solver = [getattr(self.arm, name, None) for name in ('default', 'weight')]
+        description = repr((type(self.arm).__name__, [float(l) for l in link_len], self.cells,
+                            [None if s is None else np.asarray(s).tolist() for s in solver]))
+        return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+    def load(self, cache_dir, link_len):
+        stem = os.path.join(cache_dir, 'ik_{0}'.format(self.key(link_len)))
+        try:
+            angles = np.load(stem + '.angles.npy', mmap_mode='r')
+            error = np.load(stem + '.error.npy', mmap_mode='r')
+            if angles.shape[:2] == (self.cells+1, self.cells+1) and error.shape == (self.cells, self.cells):
+                return angles, error
+        except (OSError, ValueError):
+            pass
+
+        angles, error = self.build()
+        os.makedirs(cache_dir, exist_ok=True)
+        save_atomic(stem + '.error.npy', error)
+        save_atomic(stem + '.angles.npy', angles)
+        return np.load(stem + '.angles.npy', mmap_mode='r'), np.load(stem + '.error.npy', mmap_mode='r')
+
+
+    def build(self):
+        '''
+        :return: (cells+1 x cells+1 x L) joint angles of the nodes, nan out of reach
+                 (cells x cells) interpolation error of every cell, inf if a corner is out of reach
+        '''
+        axis = np.linspace(-self.reach, self.reach, self.cells+1)
+        nodes = np.stack(np.meshgrid(axis, axis, indexing='ij'), axis=-1)    # [i, j] is (axis[i], axis[j])
+        angles, solved = self.arm.inv_kin_batch(nodes)
+        angles = np.where(solved[..., None], angles, np.nan)
+
+        centres = nodes[:-1, :-1] + self.step/2
+        exact, solved = self.arm.inv_kin_batch(centres)
+        interpolated = self.interpolate(angles, np.full(centres.shape[:2] + (2,), 0.5), np.arange(self.cells)[:, None],
+                                        np.arange(self.cells)[None, :])
+        error = np.max(np.abs(wrap(interpolated - exact)), axis=-1)
+        error[~solved | np.isnan(error)] = np.inf
+        return angles, error
+
+
+    @staticmethod
+    def interpolate(angles, t, i, j):
+        '''
+        :param angles: node angles
+        :param t: (... x 2) position of the queries inside their cell, in [0, 1]
+        :param i, j: cell indices of the queries, broadcast against t[..., 0]
+        :return: (... x L) bilinear interpolation of the angles of the 4 corners
+        '''
+        c00 = angles[i, j]
+        # corners unwrapped against c00, so that cells across the +-pi cut interpolate the short way round
+        c10 = c00 + wrap(angles[i+1, j] - c00)
+        c01 = c00 + wrap(angles[i, j+1] - c00)
+        c11 = c00 + wrap(angles[i+1, j+1] - c00)
+        tx, ty = t[..., 0, None], t[..., 1, None]
+        return (c00*(1-tx) + c10*tx)*(1-ty) + (c01*(1-tx) + c11*tx)*ty
+
+
+    def cell(self, coordinates):
+        '''
+        :return: cell indices (i, j) of every point, position t inside the cell, and whether the point is on the grid
+        '''
+        u = (coordinates + self.reach)/self.step
+        on_grid = np.all((u >= 0) & (u <= self.cells), axis=-1)
+        ij = np.clip(np.floor(u), 0, self.cells-1).astype(int)
+        return ij[..., 0], ij[..., 1], u - ij, on_grid
+
+
+    def inv_kin_batch(self, coordinates):
+        '''
+        :param coordinates: (N x 2) or (P x N x 2) array of desired xy positions
+        :return: angles : (N x L) or (P x N x L) array of joint angles
+                 solved : (N) or (P x N) boolean array, False for points out of reach (angles set to 0)
+        '''
+        coordinates = np.asarray(coordinates, dtype=float)
+        i, j, t, on_grid = self.cell(coordinates)
+        from_table = on_grid & self.accurate[i, j]
+
+        angles = np.zeros(coordinates.shape[:-1] + (self.angles.shape[-1],))
+        solved = from_table.copy()
+        angles[from_table] = self.interpolate(self.angles, t[from_table], i[from_table], j[from_table])
+
+        exact = ~from_table
+        if np.any(exact):
+            angles[exact], solved[exact] = self.arm.inv_kin_batch(coordinates[exact])
+        return angles, solved
+
+
+    def error_bound(self, coordinates):
+        '''
+        :return: estimated interpolation error (radians) of every point, 0 for points solved exactly
+        '''
+        i, j, t, on_grid = self.cell(np.asarray(coordinates, dtype=float))
+        error = np.asarray(self.error[i, j])
+        return np.where(on_grid & (error <= self.tolerance), error, 0)
+
+
+    def time_series(self, coordinate_series):
+        # the single path of the final solution is solved exactly
+        return self.arm.time_series(coordinate_series)
@@ -0,0 +1,106 @@
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+
+'''
+Instrumentation(hooks) :
+    Per generation stage timers and counters of a GeneticAlgorithm run. Pass one as the GA's instrument
+    parameter, the GA then times its stages and forwards the instrument to the fitness function, which
+    times the stages of the fitness pipeline. At the end of every generation a record
+        {'generation', 'seconds', 'timers': {stage: seconds}, 'counters': {name: count}, 'best_fitness'}
+    is appended to history and passed to every hook.
+    With instrument=None (the default) no timer or counter is touched, stage() returns a shared no-op context.
+
+    GA stages      : init, selection_crossover, mutation, fitness (everything in fitness_mod)
+    fitness stages : points, interpolation, path_points, ik, collision, cost (serial evaluation only, worker
+                     processes are timed as a whole by the fitness stage)
+    counters       : evaluations, cache_hits, invalid_points, obstacle_rejections, ik_failures, collisions,
+                     nan_fitness (fitness values fixed up to 0 by fitness_mod)
+'''
+
+
+NO_TIMER = nullcontext()
+
+
+def stage(instrument, name):
+    """
+    :return: context timing the stage name on instrument, a no-op if instrument is None
+    """
+    return NO_TIMER if instrument is None else instrument.timer(name)
+
+
+def jsonl_hook(f):
+    """
+    :param f: open text file
+    :return: hook writing every generation record to f as one line of JSON
+    """
+    def hook(record):
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+    return hook
+
+
+class Instrumentation:
+
+    def __init__(self, hooks=None):
+        """
+        hooks: callables called with the record of every finished generation
+        """
+        self.hooks = list(hooks or [])
+        self.timers = {}            # stage -> seconds, for the generation in progress
+        self.counters = {}          # counter -> count, for the generation in progress
+        self.total_timers = {}
+        self.total_counters = {}
+        self.history = []
+        self.generation_start = None
+
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0) + time.perf_counter() - start
+
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+
+    def start_generation(self):
+        self.generation_start = time.perf_counter()
+
+
+    def end_generation(self, generation, **extra):
+        """Closes the generation in progress, generation -1 being the initial population.
+        extra is added to the record.
+        """
+        record = {'generation': generation, 'seconds': time.perf_counter() - self.generation_start,
+                  'timers': self.timers, 'counters': self.counters}
+        record.update(extra)
+        self.history.append(record)
+
+        for name, value in self.timers.items():
+            self.total_timers[name] = self.total_timers.get(name, 0) + value
+        for name, value in self.counters.items():
+            self.total_counters[name] = self.total_counters.get(name, 0) + value
+        self.timers = {}
+        self.counters = {}
+
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+
+    def summary(self):
+        """
+        :return: timers and counters summed over all finished generations
+        """
+        return {'generations': len(self.history), 'seconds': sum(r['seconds'] for r in self.history),
+                'timers': dict(self.total_timers), 'counters': dict(self.total_counters)}
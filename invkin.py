@@ -2,7 +2,7 @@ import math
 import numpy as np
 
 def div(a,b):
-        return a/b if b is not 0 else math.inf if a>0 else -math.inf
+        return a/b if b != 0 else math.inf if a>0 else -math.inf
 
 class Arm :
     '''
@@ -55,18 +55,43 @@ class Arm :
         angles[0] = math.atan2(final_coords[1],final_coords[0]) - math.atan2( self.arm_lens[1]*np.sin(angles[1]), self.arm_lens[0]+ self.arm_lens[1]*np.cos(angles[1]) )
         return np.array(angles)
 
+    def inv_kin_batch(self,coordinates):
+        """
+        Returns the angles for a whole array of (x,y) coordinates, solved together in closed form
+        The angle of link-2 is constrained to move between [0,pi]
+        input:
+            coordinates : array of the order (N x 2) or (P x N x 2)
+        returns:
+            angles : array of the same shape as coordinates, [link1, link2] angles for every point
+            reachable : boolean array of the order (N) or (P x N), False for points outside the workspace.
+                        angles of unreachable points are set to 0
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        x = coordinates[...,0]
+        y = coordinates[...,1]
+
+        D = (x**2 + y**2 - self.arm_lens[0]**2 - self.arm_lens[1]**2) / (2*self.arm_lens[0]*self.arm_lens[1])
+        reachable = np.abs(D) <= 1
+        D = np.where(reachable, D, 1)
+
+        angles = np.zeros(coordinates.shape)
+        angles[...,1] = np.arctan2( np.sqrt(1-D**2), D )
+        angles[...,0] = np.arctan2(y,x) - np.arctan2( self.arm_lens[1]*np.sin(angles[...,1]), self.arm_lens[0]+ self.arm_lens[1]*np.cos(angles[...,1]) )
+        angles[~reachable] = 0
+        return angles, reachable
+
     def time_series(self,coordinate_series):
         """
-            Recursively calls  function inv_kin to calculate joint angles for every (x,y) coordinate
+            Calls function inv_kin_batch to calculate joint angles for every (x,y) coordinate
             input:
                 coordinate_series: array of the order [[x1 y1],
                                                        [x2 y2],..
                                                         ...
                                                        [xn yn]]
+            returns: (N x 2) array of angles, nan for unreachable points
         """
-        angle_series=[]
-        for i in range(len(coordinate_series)):
-            angle_series.append(self.inv_kin(coordinate_series[i]))
+        angle_series, reachable = self.inv_kin_batch(coordinate_series)
+        angle_series[~reachable] = np.nan
         return angle_series
 def test():
 
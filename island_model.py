@@ -0,0 +1,137 @@
+import multiprocessing
+import traceback
+
+import numpy as np
+
+from genetic_algorithm import GeneticAlgorithm
+
+
+'''
+run_islands(ga_args, ga_kwargs, n_islands, migration_interval, n_migrants, topology) :
+    Island model genetic algorithm. Every island is an independent GeneticAlgorithm population evolving
+    in its own process. Every migration_interval generations each island sends copies of its best
+    n_migrants chromosomes to its neighbours, which replace their worst chromosomes with them.
+    topology - 'ring' : island i sends to island i+1
+               'full' : every island sends to every other island
+    Islands wait for their neighbours' migrants, so they must all stop in the same generation. The early
+    stopping criteria of ga_kwargs (stall_generations, min_improvement, target_fitness) are therefore not
+    applied by each island, but to the best fitness over all islands, at migration points: the islands
+    share their best fitness through a barrier and all take the same decision.
+'''
+
+
+def neighbours(topology, n_islands):
+    """
+    :return: list of the islands every island sends migrants to
+    """
+    if topology == 'ring':
+        return [[(i+1) % n_islands] if n_islands > 1 else [] for i in range(n_islands)]
+    elif topology == 'full':
+        return [[j for j in range(n_islands) if j != i] for i in range(n_islands)]
+    raise ValueError("Unknown topology: {0}".format(topology))
+
+
+def global_stop(history, migration_interval, stall_generations=None, min_improvement=0.0, target_fitness=None):
+    """
+    Early stopping of GeneticAlgorithm.stopping_criterion, applied to the best fitness over all islands
+    history: best fitness over all islands at every migration point so far
+    returns: 'target', 'stalled' or None to continue
+    """
+    if target_fitness is not None and history[-1] >= target_fitness:
+        return 'target'
+    if stall_generations is not None:
+        n = -(-stall_generations // migration_interval)     # migration points covering stall_generations
+        if len(history) > n and max(history[-n:]) <= max(history[:-n])*(1+min_improvement):
+            return 'stalled'
+    return None
+
+
+def island(idx, seed, ga_args, ga_kwargs, migration_interval, n_migrants, targets, n_incoming, inboxes, results,
+           stop_kwargs, best, barrier):
+    try:
+        ga = GeneticAlgorithm(*ga_args, seed=seed, **ga_kwargs)
+        ga.verbose = False
+        history = []    # best fitness over all islands at every migration point
+
+        def migrate(genr, chromosome, fitness_row):
+            if (genr+1) % migration_interval == 0 and genr+1 < ga.generations:
+                # every island reads the same values between the two barriers, so all stop together
+                best[idx] = max(ga.best_so_far()[1], np.max(fitness_row))
+                barrier.wait()
+                history.append(max(best))
+                barrier.wait()
+                if global_stop(history, migration_interval, **stop_kwargs) is not None:
+                    ga.stop()
+                    return chromosome, fitness_row
+
+                best_idx = np.argsort(fitness_row)[::-1][:n_migrants]
+                for target in targets:
+                    inboxes[target].put((chromosome[best_idx], fitness_row[best_idx]))
+
+                incoming = [inboxes[idx].get() for i in range(n_incoming)]
+                if incoming:
+                    migrants = np.concatenate([m[0] for m in incoming])
+                    migrants_fitness = np.concatenate([m[1] for m in incoming])
+                    keep = np.argsort(migrants_fitness)[::-1][:n_migrants]
+                    worst = np.argsort(fitness_row)[:len(keep)]
+                    chromosome = chromosome.copy()
+                    fitness_row = fitness_row.copy()
+                    chromosome[worst] = migrants[keep]
+                    fitness_row[worst] = migrants_fitness[keep]
+
+            return chromosome, fitness_row
+
+        ga.run(on_generation=migrate)
+        best_points, best_fitness = ga.best_so_far()
+        results.put((idx, best_points, best_fitness, ga.fitness_stats, None))
+    except Exception:
+        barrier.abort()     # islands waiting on this one fail instead of hanging
+        results.put((idx, None, None, None, traceback.format_exc()))
+
+
+def run_islands(ga_args, ga_kwargs=None, n_islands=4, migration_interval=10, n_migrants=2, topology='ring', seed=1):
+    """
+    ga_args, ga_kwargs: arguments of GeneticAlgorithm, used for every island
+    n_islands: number of islands, each running in its own process
+    migration_interval: number of generations between migrations
+    n_migrants: number of best chromosomes each island sends to every neighbour
+    topology: 'ring' or 'full'
+    seed: seed of the run, every island gets an independent child stream spawned from it
+    returns: best_points: points of the best chromosome over all islands
+             best_fitness: its fitness
+             island_stats: fitness_stats of every island
+    """
+    ga_kwargs = dict(ga_kwargs or {})
+    stop_kwargs = {key: ga_kwargs.pop(key) for key in ('stall_generations', 'min_improvement', 'target_fitness')
+                   if key in ga_kwargs}
+    targets = neighbours(topology, n_islands)
+    n_incoming = [sum(i in t for t in targets) for i in range(n_islands)]
+
+    inboxes = [multiprocessing.Queue() for i in range(n_islands)]
+    results = multiprocessing.Queue()
+    best = multiprocessing.Array('d', n_islands, lock=False)
+    barrier = multiprocessing.Barrier(n_islands)
+    seeds = np.random.SeedSequence(seed).spawn(n_islands)
+    processes = [multiprocessing.Process(target=island, args=(i, seeds[i], ga_args, ga_kwargs, migration_interval, n_migrants,
+                                                              targets[i], n_incoming[i], inboxes, results,
+                                                              stop_kwargs, best, barrier))
+                 for i in range(n_islands)]
+    for p in processes:
+        p.start()
+
+    island_results = [None]*n_islands
+    try:
+        for i in range(n_islands):
+            idx, best_points, best_fitness, fitness_stats, error = results.get()
+            if error is not None:
+                raise RuntimeError("Island {0} failed:\n{1}".format(idx, error))
+            island_results[idx] = (best_points, best_fitness, fitness_stats)
+    finally:
+        for p, result in zip(processes, island_results):
+            if result is None:
+                p.terminate()
+            p.join()
+
+    best_idx = int(np.argmax([r[1] for r in island_results]))
+    island_stats = [r[2] for r in island_results]
+    return island_results[best_idx][0], island_results[best_idx][1], island_stats
@@ -0,0 +1,114 @@
+import concurrent.futures
+import multiprocessing
+import time
+
+import numpy as np
+
+from genetic_algorithm import GeneticAlgorithm
+
+
+'''
+multi_start(ga_args, ga_kwargs, n_runs, processes, seed, target_fitness, time_limit) :
+    Runs the same problem n_runs times with independent random streams on a pool of processes and keeps
+    the best result. Once any run reaches target_fitness the other runs are cancelled: runs not started yet
+    are dropped and runs in progress stop after their current generation (through GeneticAlgorithm.stop).
+    The spread of the best fitness over the runs is returned with the best chromosome.
+'''
+
+
+# set by any run that reached the target, shared with the pool processes by init_worker
+_cancel = None
+
+
+def init_worker(cancel):
+    global _cancel
+    _cancel = cancel
+
+
+def start(idx, seed, ga_args, ga_kwargs, time_limit):
+    if _cancel.is_set():
+        return None, None       # cancelled while queued
+
+    ga = GeneticAlgorithm(*ga_args, seed=seed, **ga_kwargs)
+    ga.verbose = False
+
+    def check_cancel(genr, chromosome, fitness_row):
+        if _cancel.is_set():
+            ga.stop()
+        return chromosome, fitness_row
+
+    ga.run(on_generation=check_cancel, time_limit=time_limit)
+    best_points, best_fitness = ga.best_so_far()
+    stats = {'run': idx, 'fitness': float(best_fitness), 'generations': len(ga.fitness_stats),
+             'stop_reason': ga.stop_reason, 'seconds': ga.budget_used['seconds'], 'evaluations': ga.budget_used['evaluations']}
+    return best_points, stats
+
+
+def spread(values):
+    """
+    :return: summary statistics of the best fitness of every run
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {}
+    return {'best': float(values.max()), 'worst': float(values.min()), 'mean': float(values.mean()),
+            'std': float(values.std()), 'median': float(np.median(values))}
+
+
+def multi_start(ga_args, ga_kwargs=None, n_runs=4, processes=None, seed=None, target_fitness=None, time_limit=None):
+    """
+    ga_args, ga_kwargs: arguments of GeneticAlgorithm, used for every run
+    n_runs: number of independently seeded runs
+    processes: size of the process pool, min(n_runs, cpus) by default
+    seed: seed of the whole multi-start, every run gets an independent child stream spawned from it
+    target_fitness: the remaining runs are cancelled once a run reaches this fitness
+    time_limit: time limit of every run, in seconds
+    returns: best_points: points of the best chromosome over all runs
+             best_fitness: its fitness
+             stats: {'runs': stats of every finished run, 'fitness': spread of their best fitness,
+                     'completed', 'cancelled', 'target_reached', 'seconds'}
+    """
+    ga_kwargs = dict(ga_kwargs or {})
+    if target_fitness is not None:
+        ga_kwargs['target_fitness'] = target_fitness
+    processes = processes or min(n_runs, multiprocessing.cpu_count())
+    seeds = np.random.SeedSequence(seed).spawn(n_runs)
+
+    start_time = time.perf_counter()
+    cancel = multiprocessing.Event()
+    best_points, best_fitness = None, 0
+    runs = []
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=init_worker, initargs=(cancel,)) as executor:
+        futures = [executor.submit(start, i, seeds[i], ga_args, ga_kwargs, time_limit) for i in range(n_runs)]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                if future.cancelled():
+                    continue
+                points, stats = future.result()
+                if stats is None:
+                    continue
+                runs.append(stats)
+                if best_points is None or stats['fitness'] > best_fitness:
+                    best_points, best_fitness = points, stats['fitness']
+                if target_fitness is not None and best_fitness >= target_fitness and not cancel.is_set():
+                    cancel.set()
+                    for f in futures:
+                        f.cancel()
+        except BaseException:
+            cancel.set()
+            for f in futures:
+                f.cancel()
+            raise
+
+    # runs stopped by a cancel report the best found so far, runs dropped from the queue are missing
+    runs.sort(key=lambda r: r['run'])
+    completed = sum(r['stop_reason'] != 'stopped' for r in runs)
+    stats = {
+        'runs': runs,
+        'fitness': spread([r['fitness'] for r in runs]),
+        'completed': completed,
+        'cancelled': n_runs - completed,
+        'target_reached': target_fitness is not None and best_fitness >= target_fitness,
+        'seconds': time.perf_counter() - start_time,
+    }
+    return best_points, best_fitness, stats
@@ -0,0 +1,96 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import trajectory_generation as tg
+
+
+'''
+ParallelFitness(fitness, fitness_params, n_genes, max_population, processes) :
+    Evaluates a population on a persistent pool of worker processes. The decoded population and the
+    fitness values are kept in shared memory, so only (start, stop) row ranges are sent to the workers
+    every generation. Each worker builds its arm once and passes it to the fitness function as 'arm'.
+    With ik_table the workers memory map the same saved IK table.
+'''
+
+
+# state of a worker process, set once by init_worker
+_worker = {}
+
+
+def init_worker(fitness, fitness_params, points_name, fitness_name, shape, ik_table):
+    _worker['fitness'] = fitness
+    _worker['fitness_params'] = fitness_params
+    _worker['arm'] = tg.make_arm(fitness_params[0], ik_table)
+    _worker['points_shm'] = shared_memory.SharedMemory(name=points_name)
+    _worker['fitness_shm'] = shared_memory.SharedMemory(name=fitness_name)
+    _worker['points'] = np.ndarray(shape, dtype=np.float64, buffer=_worker['points_shm'].buf)
+    _worker['fitness_row'] = np.ndarray(shape[0], dtype=np.float64, buffer=_worker['fitness_shm'].buf)
+
+
+def evaluate_shard(shard):
+    start, stop = shard
+    stats = {}
+    fitness_row, _ = _worker['fitness'](_worker['points'][start:stop], *_worker['fitness_params'], arm=_worker['arm'], stats=stats)
+    _worker['fitness_row'][start:stop] = fitness_row
+    return stats
+
+
+class ParallelFitness:
+    """Fitness evaluation of a population sharded across a persistent pool of processes"""
+
+    def __init__(self, fitness, fitness_params, n_genes, max_population, processes=None, ik_table=False):
+        """
+        fitness: fitness function, called as fitness(points, *fitness_params, arm=arm, stats=stats)
+        fitness_params: extra arguments of the fitness function, the first one being the link lengths
+        n_genes: number of coordinates in a decoded chromosome
+        max_population: largest number of chromosomes evaluated in one call
+        processes: number of worker processes, all cpus by default
+        ik_table: workers solve inverse kinematics with an IK table, see trajectory_generation.make_arm
+        """
+        self.processes = processes or multiprocessing.cpu_count()
+        self.shape = (max_population, n_genes)
+
+        self.points_shm = shared_memory.SharedMemory(create=True, size=8*max_population*n_genes)
+        self.fitness_shm = shared_memory.SharedMemory(create=True, size=8*max_population)
+        self.points = np.ndarray(self.shape, dtype=np.float64, buffer=self.points_shm.buf)
+        self.fitness_row = np.ndarray(max_population, dtype=np.float64, buffer=self.fitness_shm.buf)
+
+        self.pool = multiprocessing.Pool(self.processes, initializer=init_worker,
+                                         initargs=(fitness, fitness_params, self.points_shm.name, self.fitness_shm.name, self.shape, ik_table))
+
+
+    def __call__(self, points, stats=None):
+        """
+        points: (P x n_genes) array of decoded chromosomes, P <= max_population
+        stats: dict in which the statistics reported by the fitness function are accumulated
+        returns: (P) array of fitness values
+        """
+        n = len(points)
+        self.points[:n] = points
+
+        bounds = np.linspace(0, n, min(self.processes, n)+1).astype(int)
+        shard_stats = self.pool.map(evaluate_shard, list(zip(bounds[:-1], bounds[1:])))
+        if stats is not None:
+            for shard in shard_stats:
+                for key, value in shard.items():
+                    stats[key] = stats.get(key, 0) + value
+        return self.fitness_row[:n].copy()
+
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        del self.points, self.fitness_row
+        for shm in (self.points_shm, self.fitness_shm):
+            shm.close()
+            shm.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
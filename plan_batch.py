@@ -0,0 +1,182 @@
+#! /usr/bin/python3
+
+'''
+Non interactive batch planning. Reads planning problems from a JSON file (a list of problems), a JSON
+lines file (one problem per line) or stdin, plans every problem and writes one line of JSON per problem
+as soon as it is finished.
+
+problem:
+    {"id": "a", "link_lengths": [4,4], "start": [6.5,2.8], "end": [-3.3,5.1], "obstacles": [[0,5.3],[5.4,3.2]],
+     "ga": {"generations": 300, "population_size": 40, "seed": 1, ...}}
+    id is optional (defaults to the problem's position in the input), "ga" holds GeneticAlgorithm parameters
+    overriding the defaults of driver.py. Without a seed in "ga" a problem gets an independent stream
+    spawned from --seed and its index, so results do not depend on --jobs or on the order of completion.
+
+result:
+    {"id", "index", "status": "ok" | "no_path" | "error", "fitness", "generations", "stop_reason",
+     "path": [[x,y], ...], "joint_angles": [[deg, ...], ...], "timings": {"ga", "path", "ik", "total"}, "error",
+     "link_lengths", "start", "end", "obstacles"}
+    Joint angles are in degrees, null where the path point is out of reach. The problem is repeated in the
+    result, so that results can be rendered on their own (render.py).
+
+JSON lines input is read lazily, one line at a time, and with --jobs N at most 2N problems are in flight,
+so memory does not grow with the batch size (a JSON list is loaded whole). Results are written in the
+order they finish.
+
+usage: python3 plan_batch.py [problems.jsonl | -] [-o results.jsonl] [--jobs N]
+'''
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import sys
+import time
+
+import numpy as np
+
+from genetic_algorithm import GeneticAlgorithm
+import trajectory_generation as tg
+
+
+def ga_defaults(link_lengths):
+    """
+    :return: GeneticAlgorithm parameters used by driver.py for an arm with these links
+    """
+    two_links = len(link_lengths) == 2
+    return {
+        'mu': [0.5,0.5] if two_links else [0.4,0.3,0.3],
+        'epsilon': 0.1,
+        'population_size': 40,
+        'mutation_percent': 0.05,
+        'crossover_percent': 0.30,
+        'generations': 300 if two_links else 20,
+        'elitism': 1,
+        'stall_generations': 50,
+    }
+
+
+def read_problems(f):
+    """
+    :param f: open text file holding a JSON list of problems or one JSON problem per line
+    :return: iterator over (index, problem or None, error message or None)
+    """
+    first = f.read(1)
+    while first.isspace():
+        first = f.read(1)
+    if first == '[':
+        problems = json.loads(first + f.read())
+        for i, problem in enumerate(problems):
+            yield i, problem, None
+        return
+
+    lines = itertools.chain([first + f.readline()], f) if first else []
+    index = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line), None
+        except ValueError as e:
+            yield index, None, "Invalid JSON: {0}".format(e)
+        index += 1
+
+
+def to_list(a):
+    # nan is not valid JSON
+    return [[None if np.isnan(v) else float(v) for v in row] for row in a]
+
+
+def plan(index, problem, seed=None):
+    """
+    :return: result of one planning problem, errors are reported in the result
+    """
+    result = {'id': problem.get('id', index) if isinstance(problem, dict) else index, 'index': index}
+    start = time.perf_counter()
+    try:
+        link_lengths = problem['link_lengths']
+        start_cood, end_cood = problem['start'], problem['end']
+        obs_coods = problem.get('obstacles', [])
+
+        params = ga_defaults(link_lengths)
+        params.update(problem.get('ga', {}))
+        if 'seed' not in params:
+            params['seed'] = np.random.SeedSequence(seed, spawn_key=(index,))
+
+        ga = GeneticAlgorithm(link_lengths, start_cood, end_cood, obs_coods, tg.fitness_population, verbose=False, **params)
+        output_chr = ga.run()
+        t_ga = time.perf_counter()
+        best_fitness = float(ga.best_so_far()[1])
+        result.update({'link_lengths': link_lengths, 'start': start_cood, 'end': end_cood, 'obstacles': obs_coods})
+        result.update({'fitness': best_fitness, 'generations': len(ga.fitness_stats), 'stop_reason': ga.stop_reason})
+
+        if best_fitness > 0:
+            output_path = tg.chrome_traj(output_chr, start_cood, end_cood, params['epsilon'])
+            t_path = time.perf_counter()
+            link_angles_series = np.degrees(tg.make_arm(link_lengths).time_series(output_path))
+            t_ik = time.perf_counter()
+            result.update({'status': 'ok', 'path': to_list(output_path), 'joint_angles': to_list(link_angles_series)})
+        else:
+            t_path = t_ik = t_ga
+            result.update({'status': 'no_path', 'path': None, 'joint_angles': None})
+        result['timings'] = {'ga': t_ga-start, 'path': t_path-t_ga, 'ik': t_ik-t_path, 'total': time.perf_counter()-start}
+    except Exception as e:
+        result.update({'status': 'error', 'error': "{0}: {1}".format(type(e).__name__, e),
+                       'timings': {'total': time.perf_counter()-start}})
+    return result
+
+
+def error_result(index, error):
+    return {'id': index, 'index': index, 'status': 'error', 'error': error}
+
+
+def plan_serial(problems, seed=None):
+    for index, problem, error in problems:
+        yield error_result(index, error) if error is not None else plan(index, problem, seed)
+
+
+def plan_parallel(problems, jobs, seed=None):
+    """Plans on jobs processes, keeping at most 2*jobs problems submitted at once"""
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        in_flight = set()
+        for index, problem, error in problems:
+            if error is not None:
+                yield error_result(index, error)
+                continue
+            in_flight.add(executor.submit(plan, index, problem, seed))
+            if len(in_flight) >= 2*jobs:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(in_flight):
+            yield future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a batch of problems, writing one JSON result per line")
+    parser.add_argument('input', nargs='?', default='-', help="JSON or JSON lines file of problems, - for stdin")
+    parser.add_argument('-o', '--output', help="JSON lines file of results, stdout otherwise")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of problems planned in parallel")
+    parser.add_argument('--seed', type=int, default=None, help="seed of the batch, fresh entropy by default")
+    args = parser.parse_args()
+
+    f_in = sys.stdin if args.input == '-' else open(args.input)
+    f_out = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        problems = read_problems(f_in)
+        if args.jobs <= 1:
+            results = plan_serial(problems, args.seed)
+        else:
+            results = plan_parallel(problems, args.jobs, args.seed)
+        for result in results:
+            f_out.write(json.dumps(result) + '\n')
+            f_out.flush()
+    finally:
+        if f_in is not sys.stdin:
+            f_in.close()
+        if f_out is not sys.stdout:
+            f_out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,12 @@
 
 
 
-import math
-
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Slider, Button, RadioButtons
 
+from collision import joint_positions
+
 
 
 class Plotter():
@@ -101,8 +101,7 @@ class Plotter():
 		coods_x = coods_series[0][int(t*(steps-1))]
 		coods_y = coods_series[1][int(t*(steps-1))]
 
-		link.set_xdata(coods_x)
-		link.set_ydata(coods_y)
+		link.set_data(coods_x, coods_y)
 
 
 	def plot_set_lims(self, ax):
@@ -113,11 +112,13 @@ class Plotter():
 
 
 	def plot_end_path(self, ax, xs, ys):
-		ax.plot(xs, ys, '--', c="y")
+		[path] = ax.plot(xs, ys, '--', c="y")
+		return path
 
 
 	def plot_joint_path(self, ax, xs, ys):
-		ax.plot(xs, ys, '--', c="0.8")
+		[path] = ax.plot(xs, ys, '--', c="0.8")
+		return path
 
 
 	def static_plot(self, ax):
@@ -149,31 +150,83 @@ class Plotter():
 		self.plot_obstacles(ax)
 		self.plot_set_lims(ax)
 
+		return self.transition_plot_paths(ax, coods_series)
+
+
+	def transition_plot_paths(self, ax, coods_series):
+		# Paths of the end effector and of every joint, returns their artists
 		coods_x_series, coods_y_series = coods_series
-		self.plot_end_path(ax, coods_x_series.T[-1], coods_y_series.T[-1])
+		paths = [self.plot_end_path(ax, coods_x_series.T[-1], coods_y_series.T[-1])]
 		for xs, ys in zip(coods_x_series.T[:-1], coods_y_series.T[:-1]):
-			self.plot_joint_path(ax, xs, ys)
+			paths.append(self.plot_joint_path(ax, xs, ys))
+		return paths
 
 
 	def transition_show(self, link_angles_series):		
 		fig = plt.figure()
 
 		ax_main = fig.add_axes([0.1,0.2,0.8,0.7])
-		ax_slider = fig.add_axes([0.1,0.03,0.8,0.03])
+		ax_slider = fig.add_axes([0.1,0.03,0.7,0.03])
+		ax_play = fig.add_axes([0.82,0.02,0.08,0.05])
 
 		coods_series = self.get_coods_series_from_link_angles_series(link_angles_series)
 
 		self.transition_plot_base(ax_main, coods_series)
 		link = self.plot_links_by_time(ax_main, coods_series, 0)
 
+		# Only the links move. They are left out of full redraws and blitted
+		# over a saved background of the static plot instead
+		link.set_animated(True)
+		background = None
+
+		def on_draw(event):
+			nonlocal background
+			background = fig.canvas.copy_from_bbox(ax_main.bbox)
+			ax_main.draw_artist(link)
+		fig.canvas.mpl_connect("draw_event", on_draw)
 
 		slider = Slider(ax_slider, "Time", 0, 1, valinit=0)
+		slider.drawon = False
 		def on_slider_upd(val):
 			self.plot_update_links_by_time(link, coods_series, val)
-			fig.canvas.draw()
+			if background is None or not fig.canvas.supports_blit:
+				fig.canvas.draw_idle()
+				return
+			fig.canvas.restore_region(background)
+			ax_main.draw_artist(link)
+			ax_slider.redraw_in_frame()
+			fig.canvas.blit(ax_main.bbox)
+			fig.canvas.blit(ax_slider.bbox)
 		slider.on_changed(on_slider_upd)
 
+		# Playback moves the slider, at most ~200 frames whatever the path length
+		steps = len(coods_series[0])
+		frame = max(1, steps//200)/max(steps-1, 1)
+		timer = fig.canvas.new_timer(interval=25)
+		def on_timer():
+			if slider.val >= 1:
+				on_play(None)
+			else:
+				slider.set_val(min(1, slider.val + frame))
+		timer.add_callback(on_timer)
+
+		play_button = Button(ax_play, "Play")
+		playing = False
+		def on_play(event):
+			nonlocal playing
+			playing = not playing
+			if playing:
+				if slider.val >= 1:
+					slider.set_val(0)
+				timer.start()
+			else:
+				timer.stop()
+			play_button.label.set_text("Pause" if playing else "Play")
+			fig.canvas.draw_idle()
+		play_button.on_clicked(on_play)
+
 		plt.show()
+		timer.stop()
 
 
 	def picker_plot_base(self, ax):
@@ -245,36 +298,17 @@ class Plotter():
 
 
 	def get_coods_from_link_angles(self, *args):
-		coods_y = [0]
-		coods_x = [0]
-
 		if args:
 			link_angles = args[0]
 		else:
 			link_angles = self.link_angles
 
-		angle = 0
-		for l,a in zip(self.link_lengths, link_angles):
-			angle += a 
-			cood_y = coods_y[-1] + l*math.sin(math.radians(angle))
-			cood_x = coods_x[-1] + l*math.cos(math.radians(angle))
-
-			coods_y.append(cood_y)
-			coods_x.append(cood_x)
-
-		return coods_x, coods_y
+		coods_x_series, coods_y_series = self.get_coods_series_from_link_angles_series([link_angles])
+		return coods_x_series[0], coods_y_series[0]
 
 
 	def get_coods_series_from_link_angles_series(self, link_angles_series):
-		coods_y_series = []
-		coods_x_series = []
-		
-		for link_angles in link_angles_series:
-			coods_x, coods_y = self.get_coods_from_link_angles(link_angles)
-			coods_x_series.append(coods_x)
-			coods_y_series.append(coods_y)
-
-		coods_x_series = np.array(coods_x_series)
-		coods_y_series = np.array(coods_y_series)
-		
-		return coods_x_series, coods_y_series
+		# Forward kinematics of the whole series at once, link angles are in degrees
+		# and each relative to the previous link
+		positions = joint_positions(np.radians(np.asarray(link_angles_series, dtype=float)), self.link_lengths)
+		return positions[..., 0], positions[..., 1]
@@ -0,0 +1,270 @@
+#! /usr/bin/python3
+
+'''
+Headless rendering of planned trajectories to GIF, MP4 (through an ffmpeg pipe) or PNG frame files.
+
+Renderer(size, dpi, fps, max_frames) :
+    Draws with the Agg canvas, without pyplot windows. One figure, its axes and the link artist are reused
+    for every frame and every trajectory: the static plot (Plotter.transition_plot_base) is drawn once per
+    trajectory, only redrawing the paths when the problem is unchanged, and saved as a background. Every
+    frame restores the background, moves the links with Plotter.plot_update_links_by_time and draws them alone.
+render_many(jobs, processes, **renderer_kwargs) :
+    Renders many trajectories on a pool of processes, each with its own Renderer, at most 2 jobs in flight
+    per process.
+
+The command line renders the results of plan_batch.py:
+usage: python3 render.py [results.jsonl | -] [-d out_dir] [--format gif|mp4|png] [--jobs N]
+'''
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from plotter import Plotter
+
+
+class PNGWriter:
+    """One PNG file per frame, pattern holds a % format for the frame number (e.g. frames/%04d.png)"""
+
+    def __init__(self, pattern, fps, size):
+        self.pattern = pattern
+        self.size = size
+        self.n = 0
+
+    def write(self, rgba):
+        from PIL import Image
+        Image.frombuffer('RGBA', self.size, rgba, 'raw', 'RGBA', 0, 1).convert('RGB').save(self.pattern % self.n)
+        self.n += 1
+
+    def close(self):
+        pass
+
+
+class GIFWriter:
+    """Frames are reduced to a palette as they come, and the file is written on close.
+    Only the links move, so the palette of the first frame is reused for all the others.
+    """
+
+    def __init__(self, path, fps, size):
+        self.path = path
+        self.duration = int(round(1000/fps))
+        self.size = size
+        self.frames = []
+
+    def write(self, rgba):
+        from PIL import Image
+        frame = Image.frombuffer('RGBA', self.size, rgba, 'raw', 'RGBA', 0, 1).convert('RGB')
+        if self.frames:
+            self.frames.append(frame.quantize(palette=self.frames[0], dither=Image.Dither.NONE))
+        else:
+            self.frames.append(frame.quantize(colors=256, method=Image.Quantize.FASTOCTREE))
+
+    def close(self):
+        if self.frames:
+            self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:], duration=self.duration, loop=0)
+        self.frames = []
+
+
+class FFmpegWriter:
+    """Raw RGBA frames streamed to an ffmpeg process, which encodes them with libx264"""
+
+    def __init__(self, path, fps, size, ffmpeg='ffmpeg'):
+        if shutil.which(ffmpeg) is None:
+            raise RuntimeError("{0} not found, needed to write {1}".format(ffmpeg, path))
+        command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                   '-s', '{0}x{1}'.format(*size), '-r', str(fps), '-i', '-',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', '-vcodec', 'libx264', path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, rgba):
+        self.process.stdin.write(rgba)
+
+    def close(self):
+        self.process.stdin.close()
+        error = self.process.stderr.read()
+        if self.process.wait() != 0:
+            raise RuntimeError("ffmpeg failed: {0}".format(error.decode(errors='replace').strip()))
+
+
+def make_writer(output, fps, size):
+    """
+    :return: frame writer chosen by the extension of output, .gif, .png (frame pattern) or a video format
+    """
+    extension = os.path.splitext(output)[1].lower()
+    if extension == '.gif':
+        return GIFWriter(output, fps, size)
+    if extension == '.png':
+        if '%' not in output:
+            raise ValueError("PNG output needs a frame number pattern, e.g. frames_%04d.png: {0}".format(output))
+        return PNGWriter(output, fps, size)
+    return FFmpegWriter(output, fps, size)
+
+
+class Renderer:
+
+    def __init__(self, size=(6.4, 4.8), dpi=100, fps=25, max_frames=200):
+        """
+        size: figure size in inches, size*dpi is the frame size in pixels
+        fps: frames per second of GIF and video output
+        max_frames: largest number of frames of a trajectory, long paths are subsampled
+        """
+        self.fps = fps
+        self.max_frames = max_frames
+        self.figure = Figure(figsize=size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_axes([0.05,0.05,0.9,0.9])
+        self.plotter = Plotter()
+
+        self.problem = None         # problem the static plot is drawn for
+        self.paths = []
+        self.link = None
+        self.background = None
+
+
+    def setup(self, link_lengths, start_cood, end_cood, obs_coods, coods_series):
+        problem = (list(link_lengths), list(start_cood), list(end_cood), [list(c) for c in obs_coods])
+        if problem == self.problem:
+            for path in self.paths:
+                path.remove()
+            self.paths = self.plotter.transition_plot_paths(self.ax, coods_series)
+        else:
+            self.ax.cla()
+            self.plotter.link_lengths, self.plotter.start_cood, self.plotter.end_cood, self.plotter.obs_coods = problem
+            self.paths = self.plotter.transition_plot_base(self.ax, coods_series)
+            self.problem = problem
+
+            if self.link is None:
+                self.link = self.plotter.plot_links_by_time(self.ax, coods_series, 0)
+                self.link.set_animated(True)
+            else:
+                self.ax.add_line(self.link)
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+
+    def frames(self, link_angles_series, n_frames=None):
+        """
+        :param link_angles_series: (N x L) link angles in degrees, nan where the path point is out of reach
+        :param n_frames: number of frames, one per path point up to max_frames by default
+        :return: iterator over RGBA frame buffers, valid until the next frame is drawn
+        """
+        coods_series = self.plotter.get_coods_series_from_link_angles_series(link_angles_series)
+        if n_frames is None:
+            n_frames = min(len(link_angles_series), self.max_frames)
+
+        for t in np.linspace(0, 1, n_frames):
+            self.plotter.plot_update_links_by_time(self.link, coods_series, t)
+            self.canvas.restore_region(self.background)
+            self.ax.draw_artist(self.link)
+            yield self.canvas.buffer_rgba()
+
+
+    def render(self, link_lengths, start_cood, end_cood, obs_coods, link_angles_series, output, n_frames=None):
+        """
+        Renders one trajectory to output, a .gif, a video file (.mp4, ...) or a PNG pattern (frames_%04d.png)
+        """
+        link_angles_series = np.asarray(link_angles_series, dtype=float)
+        self.plotter.link_lengths = link_lengths
+        self.setup(link_lengths, start_cood, end_cood, obs_coods,
+                   self.plotter.get_coods_series_from_link_angles_series(link_angles_series))
+
+        writer = make_writer(output, self.fps, self.canvas.get_width_height())
+        try:
+            for frame in self.frames(link_angles_series, n_frames):
+                writer.write(frame)
+        finally:
+            writer.close()
+        return output
+
+
+# Renderer of a worker process, reused for every job it gets
+_renderer = None
+
+
+def init_worker(renderer_kwargs):
+    global _renderer
+    _renderer = Renderer(**renderer_kwargs)
+
+
+def render_job(job):
+    try:
+        _renderer.render(job['link_lengths'], job['start'], job['end'], job.get('obstacles', []),
+                         job['joint_angles'], job['output'], job.get('n_frames'))
+        return job['output'], None
+    except Exception as e:
+        return job.get('output'), "{0}: {1}".format(type(e).__name__, e)
+
+
+def render_many(jobs, processes=None, **renderer_kwargs):
+    """
+    jobs: iterable of dicts with link_lengths, start, end, obstacles, joint_angles (degrees), output
+          and optionally n_frames
+    processes: number of worker processes, all cpus by default
+    renderer_kwargs: arguments of Renderer
+    returns: iterator over (output, error message or None), in the order the jobs finish
+    """
+    processes = processes or os.cpu_count()
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=init_worker, initargs=(renderer_kwargs,)) as executor:
+        in_flight = set()
+        for job in jobs:
+            in_flight.add(executor.submit(render_job, job))
+            if len(in_flight) >= 2*processes:
+                done, in_flight = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(in_flight):
+            yield future.result()
+
+
+def read_jobs(f, out_dir, file_format):
+    # plan_batch.py results, problems without a path are skipped
+    for line in f:
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        if result.get('status') != 'ok':
+            continue
+        name = str(result['id'])
+        output = name + ('_%04d.png' if file_format == 'png' else '.' + file_format)
+        result['output'] = os.path.join(out_dir, output)
+        yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render plan_batch.py results to animations")
+    parser.add_argument('input', nargs='?', default='-', help="JSON lines results of plan_batch.py, - for stdin")
+    parser.add_argument('-d', '--out-dir', default='.', help="directory of the rendered files")
+    parser.add_argument('--format', choices=['gif', 'mp4', 'png'], default='gif')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="number of rendering processes")
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--max-frames', type=int, default=200)
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    f_in = sys.stdin if args.input == '-' else open(args.input)
+    renderer_kwargs = {'fps': args.fps, 'max_frames': args.max_frames}
+    try:
+        jobs = read_jobs(f_in, args.out_dir, args.format)
+        if args.jobs <= 1:
+            init_worker(renderer_kwargs)
+            results = (render_job(job) for job in jobs)
+        else:
+            results = render_many(jobs, args.jobs, **renderer_kwargs)
+        for output, error in results:
+            print(json.dumps({'output': output, 'status': 'error' if error else 'ok', 'error': error}), flush=True)
+    finally:
+        if f_in is not sys.stdin:
+            f_in.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import trajectory_generation as tg
+from island_model import run_islands
+
+
+GA_ARGS = ([4,4], [6.5,2.8], [-3.3,5.1], [[-0,5.3],[5.4,3.2]], tg.fitness_population, [0.5,0.5])
+
+
+def run_with_timeout(ga_kwargs, timeout=60, **kwargs):
+    # a hang fails the test instead of blocking the test run
+    result = []
+    thread = threading.Thread(target=lambda: result.append(run_islands(GA_ARGS, ga_kwargs, **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "run_islands did not return"
+    return result[0]
+
+
+def test_islands_stall_together():
+    best_points, best_fitness, island_stats = run_with_timeout({'verbose': False, 'stall_generations': 3},
+                                                               n_islands=3, migration_interval=5)
+    generations = [len(stats) for stats in island_stats]
+    assert len(set(generations)) == 1
+    assert generations[0] < 500
+    assert best_fitness > 0
+
+
+def test_islands_reach_target_together():
+    best_points, best_fitness, island_stats = run_with_timeout({'verbose': False, 'target_fitness': 0.3},
+                                                               n_islands=3, migration_interval=5, topology='full')
+    assert len(set(len(stats) for stats in island_stats)) == 1
+    assert best_fitness >= 0.3
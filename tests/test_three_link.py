@@ -0,0 +1,29 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from three_link import Arm3Link
+
+
+def test_inv_kin_batch_solves_reachable_points():
+    # points near the base, where Newton started from the default position often does not converge
+    arm = Arm3Link(np.array([4, 4, 3]))
+    rng = np.random.default_rng(0)
+    r = np.sqrt(rng.uniform(0, 16, 2000))
+    a = rng.uniform(-np.pi, np.pi, 2000)
+    points = np.stack([r*np.cos(a), r*np.sin(a)], axis=-1).reshape(20, 100, 2)
+
+    angles, converged = arm.inv_kin_batch(points)
+    assert converged.all()
+    positions = np.array([arm.get_position(q) for q in angles.reshape(-1, 3)])
+    assert np.abs(positions - points.reshape(-1, 2)).max() < 1e-6
+
+
+def test_inv_kin_batch_rejects_unreachable_points():
+    arm = Arm3Link(np.array([4, 4, 3]))
+    angles, converged = arm.inv_kin_batch(np.array([[12.0, 0.0], [0.5, 0.5]]))
+    assert list(converged) == [False, True]
+    assert np.all(angles[0] == 0)
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.optimize
 
 
 class Arm3Link:
@@ -16,13 +15,25 @@ class Arm3Link:
         self.angles = [.3, .3, 0] 
         # A default arm position(set randomly, any angles would work)
         self.default = np.array([np.pi/4, np.pi/4, np.pi/4]) 
+        # weights of the joints in the distance to the default position
+        self.weight = np.array([1, 1, 1.3])
         # arm lengths
         self.Len = np.array([1, 1, 1]) if Len is None else Len
 
+    def get_position(self, q):
+        """Returns the (x,y) coordinates of the hand, given the joint angles
+        input
+            q : array
+                the list of joint angles
+        """
+        phi = np.cumsum(q)
+        return np.array([np.dot(self.Len, np.cos(phi)), np.dot(self.Len, np.sin(phi))])
+
     def inv_kin(self, xy):
         """
         Given an (x,y) coords of the hand, return a set of joint angles (q)
-        using the scipy.optimize package
+        using the scipy.optimize package. The search starts from self.angles, and
+        analytic gradients of the objective and the constraints are supplied.
         input
             xy : tuple
                 the desired xy position of the arm
@@ -40,39 +51,153 @@ class Arm3Link:
             returns : 
                 euclidean distance to the default arm position
             """
-            weight = [1, 1, 1.3]
-            return np.sqrt(np.sum([(qi - q0i)**2 * wi for qi, q0i, wi in zip(q, self.default, weight)]))
-            
+            return np.sqrt(np.dot(self.weight, (q - self.default)**2))
 
-        def x_constraint(q, xy):
+        def distance_to_default_grad(q, *args):
+            """Gradient of distance_to_default with respect to the joint angles"""
+            distance = distance_to_default(q)
+            if distance == 0:
+                return np.zeros(len(q))
+            return self.weight * (q - self.default) / distance
+
+        def xy_constraint(q, xy):
             """Function required as a parameter in the scipy fucntion
             Input
                 q : array
                     the list of current joint angles
                 xy : array
-                    current xy position (not used)
+                    desired xy position
             returns : array
-                the difference between current and desired x position
+                the difference between current and desired x and y position
             """
-            x = (self.Len[0]*np.cos(q[0]) + self.Len[1]*np.cos(q[0]+q[1]) +self.Len[2]*np.cos(np.sum(q))) - xy[0]
-            return x
-
-        def y_constraint(q, xy):
+            return self.get_position(q) - xy
 
-            """Function required as a parameter in the scipy fucntion
-            Input
-                q : array
-                    the list of current joint angles
-                xy : array
-                    current xy position (not used)
-            returns : array
-                the difference between current and desired x position
+        def xy_constraint_jac(q, xy):
+            """Jacobian of xy_constraint, a (2 x 3) array
+            Joint i moves every link from i onwards, so each column is a reversed cumulative sum
             """
-            y = (self.Len[0]*np.sin(q[0]) + self.Len[1]*np.sin(q[0]+q[1]) +self.Len[2]*np.sin(np.sum(q))) - xy[1]
-            return y
+            phi = np.cumsum(q)
+            dx = -np.cumsum((self.Len * np.sin(phi))[::-1])[::-1]
+            dy = np.cumsum((self.Len * np.cos(phi))[::-1])[::-1]
+            return np.array([dx, dy])
+
 
+        import scipy.optimize   # loaded only once the iterative solver is needed
 
-        return scipy.optimize.fmin_slsqp(func=distance_to_default,x0=self.angles,eqcons=[x_constraint,y_constraint],args=(xy,),iprint=0) 
+        return scipy.optimize.fmin_slsqp(func=distance_to_default, x0=self.angles, f_eqcons=xy_constraint,
+                                         fprime=distance_to_default_grad, fprime_eqcons=xy_constraint_jac,
+                                         args=(np.asarray(xy, dtype=float),), iprint=0)
+
+    def inv_kin_batch(self, coordinates, tol=1e-10, max_iter=30, damping=1e-6):
+        """
+        Given an array of (x,y) coords of the hand, return the joint angles of every point,
+        solving the same problem as inv_kin for all points together.
+        The weighted squared distance to the default position (same minimum as inv_kin's
+        objective) is minimised subject to the hand constraints with Newton steps on the
+        KKT conditions, damped like a least squares solve to stay stable near singular poses.
+        input
+            coordinates : array
+                (N x 2) or (P x N x 2) array of desired xy positions
+            tol : float
+                convergence tolerance on the constraint violation and the optimality conditions
+            max_iter : int
+                maximum number of Newton iterations
+            damping : float
+                damping added to the constraint block of the Newton system
+        Newton started from the default position fails for some reachable points (mostly close
+        to the base, where the default position is far off). Those are retried from folded
+        positions pointing at the point, and the ones still failing are solved by inv_kin,
+        warm started from the solution of the previous point of their path.
+        returns : 
+            angles : (N x 3) or (P x N x 3) array of joint angles
+            converged : (N) or (P x N) boolean array, False where no solution was found
+                        (e.g. points outside the workspace). angles of those points are set to 0
+        """
+        coordinates = np.asarray(coordinates, dtype=float)
+        shape = coordinates.shape[:-1]
+        xy = coordinates.reshape([-1, 2])
+        n = len(xy)
+
+        q, converged = self.newton(xy, np.tile(self.default, (n, 1)), tol, max_iter, damping)
+
+        r = np.linalg.norm(xy, axis=1)
+        reachable = (r <= np.sum(self.Len)) & (r >= 2*np.max(self.Len) - np.sum(self.Len))
+        retry = np.flatnonzero(~converged & reachable)
+        phi = np.arctan2(xy[retry, 1], xy[retry, 0])
+        for offset, elbow, wrist in ((0, 2.5, 2.5), (1, 2.6, -1.5), (0, -2.5, -2.5)):
+            if len(retry) == 0:
+                break
+            start = np.column_stack([phi + offset, np.full(len(retry), elbow), np.full(len(retry), wrist)])
+            q_retry, solved = self.newton(xy[retry], start, tol, max_iter, damping)
+            q[retry[solved]] = q_retry[solved]
+            converged[retry[solved]] = True
+            retry, phi = retry[~solved], phi[~solved]
+
+        row_length = shape[-1] if shape else 1
+        angles = self.angles
+        for i in retry:
+            previous = i - 1 if i % row_length and converged[i - 1] else None
+            self.angles = self.default if previous is None else q[previous]
+            solution = self.inv_kin(xy[i])
+            if np.abs(self.get_position(solution) - xy[i]).max() < 1e-6:
+                q[i] = solution
+                converged[i] = True
+        self.angles = angles
+
+        q[~converged] = 0
+        return q.reshape(shape + (3,)), converged.reshape(shape)
+
+    def newton(self, xy, q, tol, max_iter, damping):
+        """
+        Newton iterations of inv_kin_batch for (N x 2) points xy, starting from the (N x 3) angles q.
+        returns : the angles and a boolean array, True for the points that converged
+        """
+        n = len(xy)
+        W = np.diag(self.weight)
+        q = q.copy()
+        lam = np.zeros([n, 2])
+        converged = np.zeros(n, dtype=bool)
+        active = np.arange(n)
+        KKT = np.zeros([n, 5, 5])
+        KKT[:, 3:, 3:] = -damping * np.eye(2)
+
+        for iteration in range(max_iter):
+            qa, la = q[active], lam[active]
+            phi = np.cumsum(qa, axis=1)
+            lx = self.Len * np.cos(phi)
+            ly = self.Len * np.sin(phi)
+            # joint i moves every link from i onwards, hence the reversed cumulative sums
+            rx = np.cumsum(lx[:, ::-1], axis=1)[:, ::-1]
+            ry = np.cumsum(ly[:, ::-1], axis=1)[:, ::-1]
+            J = np.stack([-ry, rx], axis=1)                                  # (n x 2 x 3)
+            c = np.stack([rx[:, 0], ry[:, 0]], axis=1) - xy[active]           # constraint violation
+            g = (qa - self.default) * self.weight + np.einsum('nij,ni->nj', J, la)
+
+            done = (np.abs(c).max(axis=1) < tol) & (np.abs(g).max(axis=1) < tol)
+            converged[active[done]] = True
+            keep = ~done
+            active, qa, la, J, c, g, rx, ry = (v[keep] for v in (active, qa, la, J, c, g, rx, ry))
+            if len(active) == 0:
+                break
+
+            # hessian of the lagrangian, second derivatives of the hand position depend on max(a, b)
+            m = np.maximum.outer(np.arange(3), np.arange(3))
+            H = W - la[:, 0, None, None] * rx[:, m] - la[:, 1, None, None] * ry[:, m]
+
+            K = KKT[:len(active)]
+            K[:, :3, :3] = H
+            K[:, :3, 3:] = np.transpose(J, (0, 2, 1))
+            K[:, 3:, :3] = J
+            rhs = -np.concatenate([g, c], axis=1)
+            step = np.linalg.solve(K, rhs[:, :, None])[:, :, 0]
+
+            # limit the joint step so that far off starting points do not overshoot
+            dq = step[:, :3]
+            scale = np.minimum(1, 0.5 / np.maximum(np.abs(dq).max(axis=1), 1e-300))
+            q[active] = qa + scale[:, None] * dq
+            lam[active] = la + scale[:, None] * step[:, 3:]
+
+        return q, converged
 
     def time_series(self,coordinate_series):
         """
@@ -81,17 +206,17 @@ class Arm3Link:
                                                    ...
                                                    [xn,yn]]
         we get the series of link angles [theta1,theta2,theta3]
+        Every point is solved once, starting from the solution of the previous point
         input
             coordinate_series: array
         returns : array
             the series of angles for every coordinate provided
         """
         angle_series=[]
-        self.angles = self.inv_kin(coordinate_series[0])
 
         for i in range(len(coordinate_series)):
-            angle_series.append(self.inv_kin(coordinate_series[i]))
             self.angles = self.inv_kin(coordinate_series[i])
+            angle_series.append(self.angles)
 
         return angle_series
 
@@ -1,9 +1,8 @@
 import numpy as np
-import scipy.interpolate as sc
-import matplotlib.pyplot as plt
 import three_link
 import invkin
-import timeit
+from collision import ObstacleIndex, joint_positions
+from instrumentation import stage
 
 '''
 generate_trajectories(sorted_population, start, end) : 
@@ -11,7 +10,7 @@ generate_trajectories(sorted_population, start, end) :
                  Each row contains 1 chromosome
     start - x and y coordinates of start point
     end - x and y coordinates of end point
-    outputs - list of interpolated functions for each chromosome (list of PchipInterpolator objects)
+    outputs - PchipPopulation interpolating every chromosome still to be evaluated
             - points are also returned.
 format(population):
     takes a population matrix andconverts into a 3D matrix for better use for generate_trajectories function.
@@ -20,6 +19,107 @@ check_point_validity(sorted_population, link1, link2)
 '''
 
 
+class PchipPopulation:
+    '''
+    Monotone piecewise cubic Hermite (PCHIP) interpolation of a whole population of curves.
+    Slopes and polynomial coefficients of every curve are computed together as arrays, following
+    the same rules as scipy.interpolate.PchipInterpolator, and evaluated for all curves at once.
+    Indexing with an integer gives a single curve, which is called like a PchipInterpolator.
+    '''
+
+    def __init__(self, x, y):
+        '''
+        :param x: (P x N) array of knot x coordinates, strictly increasing along each row
+        :param y: (P x N) array of knot y coordinates
+        '''
+        x = np.atleast_2d(np.asarray(x, dtype=float))
+        y = np.atleast_2d(np.asarray(y, dtype=float))
+        h = np.diff(x, axis=1)
+        m = np.diff(y, axis=1) / h
+        d = self.slopes(h, m)
+
+        # coefficients of c0*t**3 + c1*t**2 + c2*t + c3, with t measured from the left knot
+        self.x = x
+        self.c = np.empty([4, x.shape[0], x.shape[1] - 1])
+        self.c[0] = (d[:, :-1] + d[:, 1:] - 2 * m) / h ** 2
+        self.c[1] = (3 * m - 2 * d[:, :-1] - d[:, 1:]) / h
+        self.c[2] = d[:, :-1]
+        self.c[3] = y[:, :-1]
+        self.single = False
+
+    @staticmethod
+    def slopes(h, m):
+        '''
+        :param h: (P x N-1) knot spacings
+        :param m: (P x N-1) secant slopes
+        :return: (P x N) PCHIP derivatives at the knots
+        '''
+        d = np.zeros([h.shape[0], h.shape[1] + 1])
+        if h.shape[1] == 1:
+            d[:, 0] = d[:, 1] = m[:, 0]
+            return d
+
+        # interior knots: weighted harmonic mean of the secants, zero at local extrema
+        w1 = 2 * h[:, 1:] + h[:, :-1]
+        w2 = h[:, 1:] + 2 * h[:, :-1]
+        flat = (np.sign(m[:, 1:]) != np.sign(m[:, :-1])) | (m[:, 1:] == 0) | (m[:, :-1] == 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            whmean = (w1 / m[:, :-1] + w2 / m[:, 1:]) / (w1 + w2)
+            d[:, 1:-1] = np.where(flat, 0, 1 / whmean)
+
+        # end knots: shape preserving three point formula
+        d[:, 0] = PchipPopulation.edge_slope(h[:, 0], h[:, 1], m[:, 0], m[:, 1])
+        d[:, -1] = PchipPopulation.edge_slope(h[:, -1], h[:, -2], m[:, -1], m[:, -2])
+        return d
+
+    @staticmethod
+    def edge_slope(h0, h1, m0, m1):
+        d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+        d = np.where(np.sign(d) != np.sign(m0), 0, d)
+        return np.where((np.sign(m0) != np.sign(m1)) & (np.abs(d) > 3 * np.abs(m0)), 3 * m0, d)
+
+    def __len__(self):
+        return self.x.shape[0]
+
+    def __getitem__(self, i):
+        curve = PchipPopulation.__new__(PchipPopulation)
+        single = np.ndim(i) == 0 and not isinstance(i, slice)
+        rows = [i] if single else i
+        curve.x = self.x[rows]
+        curve.c = self.c[:, rows]
+        curve.single = single
+        return curve
+
+    def __call__(self, xq, nu=0):
+        '''
+        :param xq: query points, either a scalar or 1D array shared by all curves, or a (P x M) array with a row per curve
+        :param nu: order of derivative to evaluate
+        :return: (P x ...) array of values, or an array shaped like xq for a single curve.
+                 Points outside the knots are extrapolated from the end polynomials.
+        '''
+        xq = np.asarray(xq, dtype=float)
+        P = self.x.shape[0]
+        if self.single or xq.ndim < 2:
+            xq = np.broadcast_to(xq, (P,) + xq.shape)
+        shape = xq.shape
+        xq = xq.reshape([P, int(np.prod(shape[1:]))])
+
+        rows = np.arange(P)[:, None]
+        idx = np.sum(xq[:, :, None] >= self.x[:, None, 1:-1], axis=2)   # interval of every query point
+        t = xq - self.x[rows, idx]
+        c = self.c[:, rows, idx]
+
+        value = np.zeros(xq.shape)
+        for power in range(3 - nu, -1, -1):   # horner's rule over the differentiated polynomial
+            factor = np.prod(np.arange(power + 1, power + nu + 1))
+            value = value * t + factor * c[3 - power - nu]
+        value = value.reshape(shape)
+        return value[0] if self.single else value
+
+    def derivative(self, nu=1):
+        return lambda xq: self(xq, nu)
+
+
 def generate_trajectories(formatted_population, start, end, fitness_calculated):
     '''
     :param sorted_population: (P x K x 2) array of formatted population
@@ -28,7 +128,8 @@ def generate_trajectories(formatted_population, start, end, fitness_calculated):
     :param fitness_calculated: boolean list stating whether a chromosome's fitness has been calculated.
                                only those chromosome's values are calculated, whose points are not valid.
     :return: trajectory_points: a (P x (N+2) x 2) array of all internal and end points
-             population_trajectories: list of all population trajectories. Invalid chromosomes have 'False' in their index
+             population_trajectories: PchipPopulation of the chromosomes whose fitness is not yet calculated.
+                                      its 'index' attribute holds their row numbers in the population
     '''
     # Every chromosome's points are seperated and arranged in form of x and y coordinates.
     # It is then arranged in the order of x coordinated. Start and End point coordinates are then added to the array.
@@ -40,19 +141,18 @@ def generate_trajectories(formatted_population, start, end, fitness_calculated):
     else:
         left_end = end
 
-    population_trajectories = [False for g in range(shape[0])]
     trajectory_points = np.zeros([shape[0], shape[1] + 2, shape[2]])
-    for i in range(shape[0]):
-        if fitness_calculated[i]:
-            continue
-        ch_with_start = np.insert(formatted_population[i, :, :], 0, left_end, axis=0)
-        chrome_all_pts = np.insert(ch_with_start, (shape[1] + 1), right_end, axis=0)
-        population_trajectories[i] = sc.PchipInterpolator(chrome_all_pts[:, 0], chrome_all_pts[:, 1])
-        trajectory_points[i, :, :] = chrome_all_pts
+    trajectory_points[:, 0, :] = left_end
+    trajectory_points[:, 1:-1, :] = formatted_population
+    trajectory_points[:, -1, :] = right_end
+
+    index = np.flatnonzero(np.logical_not(fitness_calculated))
+    population_trajectories = PchipPopulation(trajectory_points[index, :, 0], trajectory_points[index, :, 1])
+    population_trajectories.index = index
     return trajectory_points, population_trajectories
 
 
-def chrome_traj(chrome, start, end):
+def chrome_traj(chrome, start, end, epsilon=0.1):
     sorted_chrome = format(chrome)
     sh = np.shape(sorted_chrome)
     left_end, right_end = start, start
@@ -63,89 +163,72 @@ def chrome_traj(chrome, start, end):
     K = sh[1]
     ch_with_start = np.insert(sorted_chrome, 0, left_end, axis=1)
     chrome_all_pts = np.insert(ch_with_start, (K + 1), right_end, axis=1)
-    ch_x, ch_y = chrome_all_pts[:, :, 0][0], chrome_all_pts[:, :, 1][0]
-    trajectory = sc.PchipInterpolator(ch_x, ch_y)
-    traj_points = path_points(trajectory, 0.1, start, end)
+    trajectory = PchipPopulation(chrome_all_pts[:, :, 0], chrome_all_pts[:, :, 1])[0]
+    traj_points = path_points(trajectory, epsilon, start, end)
     return traj_points
 
 
 def format(population) -> object:
     '''
     :param population: complete population in 2D matrix (P x 2k)
-    :return: sorted_population: 3D array (P x k x 2)
+    :return: sorted_population: 3D array (P x k x 2), points of every chromosome sorted by x coordinate
     '''
     shape = np.shape(population)
-    if len(shape) == 1:
-        P = 1
-        K = int(shape[0]/2)
-    elif len(shape) == 2:
-        P = shape[0]
-        K = int(shape[1]/2)
-    formatted_population = np.zeros([P, K, 2])
-    for i in range(P):
-        if P == 1:
-            chrome = np.reshape(population, [K, 2])
-        else:
-            chrome = np.reshape(population[i, :], [K, 2])
-        chrome_sorted = chrome[chrome[:, 0].argsort()].transpose()
-        formatted_population[i, :, :] = chrome_sorted.transpose()
-    return formatted_population
-
-
-def check_point_validity(formatted_population, link_len, start, end) -> list:
+    P = 1 if len(shape) == 1 else shape[0]
+    K = int(shape[-1]/2)
+    formatted_population = np.reshape(np.asarray(population, dtype=float), [P, K, 2])
+    order = np.argsort(formatted_population[:, :, 0], axis=1)
+    return np.take_along_axis(formatted_population, order[:, :, None], axis=1)
+
+
+def check_point_validity(formatted_population, link_len, start, end):
     '''
     :param sorted_population: 3D array of sorted population matrix
-    :param link1: length of link 1
-    :param link2: length of link 2
-    :return: validity: list of indexed validity values. could be used for setting fitness to zero.
+    :param link_len: list of link lengths
+    :return: validity: boolean array of indexed validity values. could be used for setting fitness to zero.
     '''
-    shape = np.shape(formatted_population)
     left_end, right_end = start, start
     if start[0] < end[0]:
         right_end = end
     else:
         left_end = end
-    validity = []
-    for i in range(shape[0]):
-        r = np.linalg.norm(formatted_population[i, :, :], axis=1)
-        if np.any(formatted_population[i, :, 0] < left_end[0]):
-            validity.append(False)
-        elif np.any(formatted_population[i, :, 0] > right_end[0]):
-            validity.append(False)
-        elif np.all(r > link_len[0]):
-            if np.all(r < (sum(link_len))):
-                if np.all(formatted_population[i,:,1] > 0):
-                    validity.append(True)
-                else:
-                    validity.append(False)
-            else:
-                validity.append(False)
-        else:
-            validity.append(False)
+    x = formatted_population[:, :, 0]
+    r = np.linalg.norm(formatted_population, axis=2)
 
+    validity = np.all(x > left_end[0], axis=1) & np.all(x < right_end[0], axis=1)
+    validity &= np.all(np.diff(x, axis=1) > 0, axis=1)  # interpolation needs distinct x coordinates
+    validity &= np.all(r > link_len[0], axis=1) & np.all(r < sum(link_len), axis=1)
+    validity &= np.all(formatted_population[:, :, 1] > 0, axis=1)
     return validity
 
 
 def check_trajectory_validity(trajectory, obstacles):
     '''
-    :param trajectory:
+    :param trajectory: PchipPopulation of trajectories, or a single trajectory
     :param obstacles: (x, y) coordinates in the form of :   [x1, x2, ... xn]  (2 x N matrix)
                                                             [y1, y2, ... yn]
-    :return: single boolean value of 'validity'
+    :return: boolean array of 'validity' for every trajectory, single boolean value for a single trajectory
     '''
-    obstacles = np.array(obstacles)
+    obstacles = np.reshape(np.array(obstacles, dtype=float), [-1, 2])
     # print(trajectory(obstacles[:,0]), obstacles[:,1])
 
-    if np.any(trajectory(obstacles[:,0]) > obstacles[:,1]):  # value of path at x is greater than y coord of point
-        validity = False
-    else:
-        validity = True
+    # value of path at x is greater than y coord of point
+    validity = np.logical_not(np.any(trajectory(obstacles[:,0]) > obstacles[:,1], axis=-1))
     return validity
 
 
+def dense_samples(epsilon, start, end, oversample=8):
+    """
+    :return: x coordinates from start to end, spaced finely enough that the arc length
+             measured over them is accurate at the scale of epsilon
+    """
+    n = int(np.ceil(oversample * abs(end[0] - start[0]) / epsilon)) + 1
+    return np.linspace(start[0], end[0], max(n, 2))
+
+
 def path_points(y, epsilon, start, end):
     """
-    :param y: PchipInterpolator object for chromosome
+    :param y: interpolated trajectory of a chromosome, a single curve of a PchipPopulation or a PchipInterpolator
     :param epsilon: parameter for distance between points
     :param start: (x, y) coordinates of start point
     :param end: (x, y) coordinates of end point
@@ -156,128 +239,180 @@ def path_points(y, epsilon, start, end):
     (N is variable to accomodate for equal disatnce between consecutive points)
     the points are the path points as the arm travels from the start point to the end point.
     """
-    # temporary lists to store x and y coordinates
-    pt_x = [start[0]]
-    pt_y = [start[1]]
-    der = y.derivative()
-
-    # iterator point
-    x = start[0]
-
-    if start[0] < end[0]:  # start point is on left side
-        while x < end[0]:
-            del_x = epsilon / np.sqrt(der(x) ** 2 + 1)
-            if (x + del_x) < end[0]:
-                pt_x.append(x + del_x)
-                pt_y.append(y(x + del_x))
-                x += del_x
-            else:
-                pt_x.append(end[0])
-                pt_y.append(end[1])
-                break
-    else:  # end point on left side
-        while x > end[0]:
-            del_x = epsilon / np.sqrt(der(x) ** 2 + 1)
-            if (x - del_x) > end[0]:
-                pt_x.append(x - del_x)
-                pt_y.append(y(x - del_x))
-                x -= del_x
-            else:
-                pt_x.append(end[0])
-                pt_y.append(end[1])
-                break
-
-    points = np.zeros([2, len(pt_x)])
-    points[0, :] = np.array(pt_x)
-    points[1, :] = np.array(pt_y)
-
-    return points.transpose()
-
-
-def fitness_population(population, link_len, start_pt, end_pt, obstacles, epsilon, mu, Single=False):
+    # the curve is sampled densely once, and points at every epsilon of arc length are picked from it
+    x = dense_samples(epsilon, start, end)
+    s = np.concatenate(([0], np.cumsum(np.hypot(np.diff(x), np.diff(y(x))))))
+
+    pt_x = np.interp(np.arange(0, s[-1], epsilon), s, x)
+    points = np.zeros([len(pt_x) + 1, 2])
+    points[:-1, 0] = pt_x
+    points[:-1, 1] = y(pt_x)
+    points[-1, :] = end
+
+    return points
+
+
+def path_points_population(trajectories, epsilon, start, end):
+    """
+    Same as path_points, for every trajectory of a PchipPopulation at once
+    :param trajectories: PchipPopulation of P trajectories
+    :return: points: (P x N x 2) array of path points, rows shorter than N are padded with the end point
+             lengths: (P) array with the number of path points of every trajectory
     """
-    Envelope function for complete fitness calculation
-    Order of operations:
-    1. point checking       (set fitness to zero for invalid)
-    2. path interpolation
-    3. path discretization
-    4. reverse kinematics on path
-    5. Path checking        (check order here)
-    5. fitness calculation
+    P = len(trajectories)
+    x = dense_samples(epsilon, start, end)
+    M = len(x)
+    s = np.zeros([P, M])
+    s[:, 1:] = np.cumsum(np.hypot(np.diff(x), np.diff(trajectories(x), axis=1)), axis=1)
+
+    lengths = np.ceil(s[:, -1] / epsilon).astype(int) + 1
+    N = lengths.max() if P else 1
+    target = np.minimum(np.arange(N - 1) * epsilon, s[:, -1:])   # (P x N-1)
+
+    # np.interp of every row in one call, rows are shifted apart so one searchsorted covers all of them
+    shift = np.arange(P)[:, None] * (s[:, -1].max(initial=0) + 1)
+    pos = np.searchsorted((s + shift).ravel(), (target + shift).ravel(), side='right') - 1
+    pos = np.clip(pos.reshape(target.shape) % M, 0, M - 2)
+    rows = np.arange(P)[:, None]
+    ds = s[rows, pos + 1] - s[rows, pos]
+    frac = np.divide(target - s[rows, pos], ds, out=np.zeros_like(ds), where=ds > 0)
+    pt_x = x[pos] + frac * (x[pos + 1] - x[pos])
+
+    points = np.zeros([P, N, 2])
+    points[:, :, :] = end
+    points[:, :-1, 0] = pt_x
+    points[:, :-1, 1] = trajectories(pt_x)
+    padding = np.arange(N) >= lengths[:, None] - 1
+    points[padding] = end
+
+    return points, lengths
+
+
+def make_arm(link_len, ik_table=False):
+    """
+    :param ik_table: answer inverse kinematics from a precomputed ik_table.IKTable, worth it for three links
+                     (two links are solved in closed form, faster than the lookup)
+    :return: arm object used for inverse kinematics, according to the number of links
     """
     if len(link_len) == 3:
-        arm1 = three_link.Arm3Link(link_len)
+        arm = three_link.Arm3Link(np.array(link_len))
     elif len(link_len) == 2:
-        arm1 = invkin.Arm(link_len)
+        arm = invkin.Arm(link_len)
+    if ik_table:
+        from ik_table import IKTable
+        return IKTable(arm, link_len)
+    return arm
+
+
+# clearance every link of the arm must keep from the obstacle points
+OBSTACLE_RADIUS = 0.2
+
+
+def count_rejections(stats, stage, n):
+    if stats is not None:
+        stats[stage] = stats.get(stage, 0) + int(n)
+
+
+def fitness_population(population, link_len, start_pt, end_pt, obstacles, epsilon, mu, Single=False, arm=None, stats=None, obs_radius=OBSTACLE_RADIUS, instrument=None):
+    """
+    Envelope function for complete fitness calculation
+    Evaluated as a pipeline of stages from cheap to expensive. Each stage works on the whole set of
+    chromosomes that survived the previous stages, and rejected chromosomes get fitness zero (infinite cost).
+    1. point checking       (internal points inside the workspace and between the end points)
+    2. path interpolation, and obstacle checking on the interpolated path
+    3. path discretization
+    4. reverse kinematics on path      (every path point must be solved)
+    5. link collision checking         (no link may pass within obs_radius of an obstacle at any path point)
+    6. fitness calculation
+    arm: arm object to reuse for inverse kinematics, one is made from link_len if not given
+    stats: dict in which the number of evaluated chromosomes ('evaluated') and of rejections at every
+           stage ('points', 'obstacles', 'ik', 'collision') are accumulated
+    instrument: Instrumentation timing every stage, None to disable
+    """
+    arm1 = make_arm(link_len) if arm is None else arm
 
     if Single == True:
         pop_size = 1
     else:
         pop_size = np.shape(population)[0]
 
-    cost_pop = [np.inf for i in range(pop_size)]  # stores fitness values
-    fitness_calculated = [False for i in range(pop_size)]  # stores fitness calculation validity
-
-    formatted_pop = format(population)
-    pt_validity = check_point_validity(formatted_pop, link_len, start_pt, end_pt)
-    for i in range(pop_size):
-        if pt_validity[i] == False:
-            cost_pop[i] = np.inf
-            fitness_calculated[i] = True
-
-    points, trajectories = generate_trajectories(formatted_pop, start_pt, end_pt, fitness_calculated)
-    #print(trajectories)
-    traj_points = None
-    for i in range(pop_size):
-        if fitness_calculated[i] == False:
-            traj_points = path_points(trajectories[i], epsilon, start_pt, end_pt)
-            # plt.plot(traj_points[:, 0], traj_points[:, 1])
-            # t = np.linspace(-4, 4, 100)
-            # plt.plot(t, np.sqrt(4 - t**2))
-            # plt.plot(t, np.sqrt(16 - t ** 2))
-            # plt.show()
-            theta = np.array(arm1.time_series(traj_points))
-            validity = check_trajectory_validity(trajectories[i], obstacles)
-            if validity == False:
-                cost_pop[i] = np.inf
-            else:
-                cost_pop[i] = fitness_chrome(theta, mu)
-            fitness_calculated[i] = True
-
-    fitness_pop = 1/np.array(cost_pop)
+    cost_pop = np.full(pop_size, np.inf)  # stores cost values, infinite for rejected chromosomes
+    count_rejections(stats, 'evaluated', pop_size)
+
+    # 1. point checking
+    with stage(instrument, 'points'):
+        formatted_pop = format(population)
+        pt_validity = check_point_validity(formatted_pop, link_len, start_pt, end_pt)
+    count_rejections(stats, 'points', pop_size - np.count_nonzero(pt_validity))
+
+    # 2. interpolation and obstacle checking
+    with stage(instrument, 'interpolation'):
+        points, trajectories = generate_trajectories(formatted_pop, start_pt, end_pt, np.logical_not(pt_validity))
+        index = trajectories.index
+        traj_validity = check_trajectory_validity(trajectories, obstacles)
+    count_rejections(stats, 'obstacles', len(index) - np.count_nonzero(traj_validity))
+    trajectories, index = trajectories[traj_validity], index[traj_validity]
+
+    # 3. discretization
+    with stage(instrument, 'path_points'):
+        pop_traj_points, traj_lengths = path_points_population(trajectories, epsilon, start_pt, end_pt)
+
+    # 4. inverse kinematics of every remaining path at once
+    with stage(instrument, 'ik'):
+        pop_theta, ik_solved = arm1.inv_kin_batch(pop_traj_points)
+    ik_validity = np.all(ik_solved, axis=1)
+    count_rejections(stats, 'ik', len(index) - np.count_nonzero(ik_validity))
+    pop_theta, pop_traj_points, traj_lengths = pop_theta[ik_validity], pop_traj_points[ik_validity], traj_lengths[ik_validity]
+    index = index[ik_validity]
+
+    # 5. collision of the links with the obstacles, at every pose along the path
+    with stage(instrument, 'collision'):
+        obstacle_index = ObstacleIndex(obstacles, obs_radius)
+        collision_free = np.logical_not(np.any(obstacle_index.poses_collide(joint_positions(pop_theta, link_len)), axis=1))
+    count_rejections(stats, 'collision', len(index) - np.count_nonzero(collision_free))
+
+    # 6. cost
+    with stage(instrument, 'cost'):
+        cost_pop[index[collision_free]] = fitness_chrome_population(pop_theta[collision_free], traj_lengths[collision_free], mu)
+    traj_points = pop_traj_points[-1, :traj_lengths[-1]] if len(index) else None
+
+    fitness_pop = 1/cost_pop
     #fitness_pop = np.array(cost_pop)
 
-    return np.array(fitness_pop), traj_points
+    return fitness_pop, traj_points
 
 
 def fitness_chrome(theta, mu):
-    # check for mu dependency on links
     '''
-    :param theta: 2 x N matrix of link angles at discrete points
-    :param mu: fitness parameters' list. see initial note for setting mu
-    :return: fitness value of the chromosome
+    :param theta: N x L matrix of link angles at discrete points
+    :param mu: fitness parameters' list, weight of every link. see initial note for setting mu
+    :return: fitness value (cost) of the chromosome, the weighted sum of joint displacements along the path
     theta in format of
-    [ th11 th12 th13 th14 ... th1n]     link 1 angles
-    [ th21 th22 th23 th24 ... th2n]     link 2 angles
-    theta1 and theta 2 are at discrete points on the path.
-    internal variables:
-    div = no. of theta divisions, 1 dimension of theta matrix
+    [ th11 th21 ]     angles of every link at point 1
+    [ th12 th22 ]     angles of every link at point 2
+    ...
+    [ th1n th2n ]
     '''
-    # check this while changing code for different input format
+    del_theta = np.abs(np.diff(theta[:, :len(mu)], axis=0))
+    return np.sum(del_theta.dot(mu))
 
-    theta = theta.T
-    div = np.shape(theta)[1]
-    theta_i = theta[:, 0:div - 2]
-    theta_j = theta[:, 1:div - 1]
-    del_theta = abs(theta_j - theta_i)
-    fitness = 0
-    for i in range(div - 2):
-        for j in range(len(mu)):
-            fitness += mu[j] * theta[j, i]
-    return fitness
+
+def fitness_chrome_population(theta, lengths, mu):
+    '''
+    fitness_chrome for a whole population of padded angle arrays
+    :param theta: P x N x L array of link angles, only the first lengths[i] points of row i are used
+    :param lengths: (P) array of the number of points of every path
+    :param mu: fitness parameters' list, weight of every link
+    :return: (P) array of costs
+    '''
+    del_theta = np.abs(np.diff(theta[:, :, :len(mu)], axis=1))
+    del_theta[np.arange(theta.shape[1] - 1) >= np.reshape(lengths, [-1, 1]) - 1] = 0
+    return del_theta.dot(mu).sum(axis=1)
 
 
 def testing_fitness():
+    import matplotlib.pyplot as plt
+
     test_mat = np.array([[1.1, 2.2, 1.5, 2, -1, 1.3],
                          [-2, 1.5, 2, 2, 0, 0.75],
                          [0.5, 0.5, 1, 0.7, -2, 0.5]])